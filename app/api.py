@@ -0,0 +1,176 @@
+"""Async HTTP API over the assistant, alongside the Streamlit front end.
+
+Endpoints:
+    POST /answer                 {"question", "model", "search_type", "conversation_id"?, "stream"?}
+    POST /feedback               {"conversation_id", "feedback": 1 | -1}
+    GET  /conversations/recent   ?limit=5&relevance=RELEVANT
+    GET  /feedback/stats
+    GET  /health
+
+Elasticsearch and LLM requests are awaited on the event loop; query encoding
+and database calls run on worker threads. With "stream": true, /answer returns
+newline-delimited JSON: {"token": ...} lines followed by one
+{"conversation_id", "answer_data"} line (or {"error": ...} on failure).
+
+Example:
+    python api.py --port 8000
+"""
+import os
+import json
+import uuid
+import asyncio
+import logging
+import argparse
+
+from aiohttp import web
+
+from assistant import EVALUATION_MODE, PENDING_RELEVANCE, coalescing_stats, get_answer_async
+from db import flush_writes, get_feedback_stats, get_recent_conversations, save_conversation, save_feedback
+from evaluator import get_evaluator, schedule_evaluation
+from llm_clients import LLMError, llm_client_stats
+from reranker import reranker_stats
+from resources import resource_stats
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+
+SEARCH_TYPES = ("Text", "Vector")
+LLM_UNAVAILABLE = "The language model is currently unavailable. Please try again shortly."
+REQUEST_FAILED = "An error occurred while processing your request."
+
+
+def dumps(data):
+    # Conversation rows carry datetimes
+    return json.dumps(data, default=str)
+
+def json_response(data, status=200):
+    return web.json_response(data, status=status, dumps=dumps)
+
+def error_response(message, status):
+    return json_response({'error': message}, status=status)
+
+async def read_json(request):
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text=dumps({'error': 'Request body must be JSON'}), content_type='application/json')
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text=dumps({'error': 'Request body must be a JSON object'}), content_type='application/json')
+    return body
+
+async def record_conversation(conversation_id, question, answer_data):
+    """Save the conversation and queue it for the background judge when it is PENDING."""
+    await asyncio.to_thread(save_conversation, conversation_id, question, answer_data)
+    if answer_data['relevance'] == PENDING_RELEVANCE:
+        schedule_evaluation(conversation_id, question, answer_data['answer'])
+
+
+async def answer(request):
+    body = await read_json(request)
+    question = (body.get('question') or '').strip()
+    model_choice = body.get('model') or 'gpt-4o-mini'
+    search_type = body.get('search_type') or 'Vector'
+    conversation_id = body.get('conversation_id') or str(uuid.uuid4())
+    if not question:
+        return error_response("'question' is required", 400)
+    if search_type not in SEARCH_TYPES:
+        return error_response(f"'search_type' must be one of {', '.join(SEARCH_TYPES)}", 400)
+
+    if not body.get('stream'):
+        try:
+            answer_data = await get_answer_async(question, model_choice, search_type)
+        except LLMError as e:
+            logger.error(f"Error getting answer: {e}")
+            return error_response(LLM_UNAVAILABLE, 503)
+        except Exception as e:
+            logger.error(f"Error getting answer: {e}")
+            return error_response(REQUEST_FAILED, 500)
+        await record_conversation(conversation_id, question, answer_data)
+        return json_response({'conversation_id': conversation_id, 'answer_data': answer_data})
+
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+
+    async def write_line(data):
+        await response.write((dumps(data) + "\n").encode())
+
+    async def on_token(text):
+        await write_line({'token': text})
+
+    try:
+        answer_data = await get_answer_async(question, model_choice, search_type, on_token=on_token)
+    except LLMError as e:
+        logger.error(f"Error getting answer: {e}")
+        await write_line({'error': LLM_UNAVAILABLE})
+    except Exception as e:
+        logger.error(f"Error getting answer: {e}")
+        await write_line({'error': REQUEST_FAILED})
+    else:
+        await record_conversation(conversation_id, question, answer_data)
+        await write_line({'conversation_id': conversation_id, 'answer_data': answer_data})
+    await response.write_eof()
+    return response
+
+async def feedback(request):
+    body = await read_json(request)
+    conversation_id = body.get('conversation_id')
+    value = body.get('feedback')
+    if not conversation_id or value not in (1, -1):
+        return error_response("'conversation_id' and 'feedback' (1 or -1) are required", 400)
+    await asyncio.to_thread(save_feedback, conversation_id, value)
+    return json_response({'conversation_id': conversation_id, 'feedback': value})
+
+async def recent_conversations(request):
+    try:
+        limit = int(request.query.get('limit', '5'))
+    except ValueError:
+        return error_response("'limit' must be an integer", 400)
+    relevance = request.query.get('relevance') or None
+    rows = await asyncio.to_thread(get_recent_conversations, limit=limit, relevance=relevance)
+    return json_response([dict(row) for row in rows])
+
+async def feedback_stats(request):
+    return json_response(await asyncio.to_thread(get_feedback_stats))
+
+async def health(request):
+    return json_response({
+        'resources': resource_stats(), 'llm_providers': llm_client_stats(), 'coalescing': coalescing_stats(),
+        'reranker': reranker_stats(),
+    })
+
+
+async def on_startup(app):
+    # Start the background judge (and resume rows left PENDING) before taking traffic
+    if EVALUATION_MODE == "async":
+        await asyncio.to_thread(get_evaluator)
+
+async def on_cleanup(app):
+    await asyncio.to_thread(flush_writes)
+
+def create_app():
+    app = web.Application()
+    app.add_routes([
+        web.post('/answer', answer),
+        web.post('/feedback', feedback),
+        web.get('/conversations/recent', recent_conversations),
+        web.get('/feedback/stats', feedback_stats),
+        web.get('/health', health),
+    ])
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async HTTP API for the knowledge assistant.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
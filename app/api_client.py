@@ -0,0 +1,78 @@
+"""Client for api.py, used by the Streamlit app when API_URL is set.
+
+The functions mirror the ones app.py otherwise calls in-process, so the front
+end does not load models or open database connections itself.
+"""
+import os
+import json
+import logging
+
+import requests
+
+from llm_clients import LLMError
+
+logger = logging.getLogger(__name__)
+
+API_URL = (os.getenv("API_URL") or "").rstrip("/")
+# Seconds to wait for a response (for streams, between chunks)
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "120"))
+
+_session = requests.Session()
+
+
+def raise_for_error(response):
+    if response.status_code == 503:
+        raise LLMError(f"{response.url} returned 503: {response.text}")
+    response.raise_for_status()
+
+def get_answer(query, model_choice, search_type, conversation_id, on_token=None):
+    """Answer a question through the API; the API also saves the conversation.
+
+    When on_token is given the answer is streamed to it as it arrives.
+    """
+    body = {
+        'question': query,
+        'model': model_choice,
+        'search_type': search_type,
+        'conversation_id': conversation_id,
+        'stream': on_token is not None,
+    }
+    with _session.post(f"{API_URL}/answer", json=body, stream=on_token is not None, timeout=API_TIMEOUT) as response:
+        raise_for_error(response)
+        if on_token is None:
+            return response.json()['answer_data']
+        for line in response.iter_lines():
+            if not line:
+                continue
+            message = json.loads(line)
+            if 'token' in message:
+                on_token(message['token'])
+            elif 'error' in message:
+                raise LLMError(message['error'])
+            else:
+                return message['answer_data']
+    raise LLMError("Answer stream ended without a result")
+
+def save_feedback(conversation_id, feedback):
+    response = _session.post(
+        f"{API_URL}/feedback", json={'conversation_id': conversation_id, 'feedback': feedback}, timeout=API_TIMEOUT
+    )
+    raise_for_error(response)
+
+def get_recent_conversations(limit=5, relevance=None):
+    params = {'limit': limit}
+    if relevance:
+        params['relevance'] = relevance
+    response = _session.get(f"{API_URL}/conversations/recent", params=params, timeout=API_TIMEOUT)
+    raise_for_error(response)
+    return response.json()
+
+def get_feedback_stats():
+    response = _session.get(f"{API_URL}/feedback/stats", timeout=API_TIMEOUT)
+    raise_for_error(response)
+    return response.json()
+
+def get_health():
+    response = _session.get(f"{API_URL}/health", timeout=API_TIMEOUT)
+    raise_for_error(response)
+    return response.json()
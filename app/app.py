@@ -1,21 +1,35 @@
+import os
 import uuid
 import time
 import logging
 import streamlit as st
 
-from assistant import get_answer
-from db import (
-    save_conversation,
-    save_feedback,
-    get_recent_conversations,
-    get_feedback_stats,
-)
+from llm_clients import LLMError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Constants
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+# When set, the app is a thin client of api.py, which answers, saves and evaluates
+API_URL = os.getenv("API_URL")
+
+if API_URL:
+    import api_client
+    from api_client import save_feedback, get_recent_conversations, get_feedback_stats
+else:
+    from assistant import get_answer, coalescing_stats, EVALUATION_MODE, PENDING_RELEVANCE
+    from db import (
+        save_conversation,
+        save_feedback,
+        get_recent_conversations,
+        get_feedback_stats,
+    )
+    from evaluator import get_evaluator, schedule_evaluation
+    from llm_clients import llm_client_stats
+    from resources import resource_stats
+
 MODEL_OPTIONS = [
     "gpt-4o-mini",
     "llama3-70b-8192",
@@ -47,17 +61,36 @@ def get_user_input():
         submit_button = st.form_submit_button(label='Ask')
     return model_choice, search_type, user_input, submit_button
 
-def display_answer(answer_data):
+def display_answer(answer_data, show_answer=True):
     st.success("Completed!")
-    st.write(answer_data["answer"])
+    if show_answer:
+        st.write(answer_data["answer"])
     # Display monitoring information
     st.write(f"Response time: {answer_data['response_time']:.2f} seconds")
+    if answer_data.get("first_token_time") is not None:
+        st.write(f"Time to first token: {answer_data['first_token_time']:.2f} seconds")
+    if answer_data.get("cache_hit"):
+        st.write("Served from answer cache")
+    if answer_data.get("degradations"):
+        st.write(f"Degraded to meet the latency budget: {', '.join(answer_data['degradations'])}")
     st.write(f"Relevance: {answer_data['relevance']}")
     st.write(f"Model used: {answer_data['model_used']}")
     st.write(f"Total tokens: {answer_data['total_tokens']}")
+    if answer_data.get("context_docs"):
+        st.write(f"Context: {answer_data['context_docs']} documents, {answer_data['context_tokens']} tokens")
     if answer_data["openai_cost"] > 0:
         st.write(f"OpenAI cost: ${answer_data['openai_cost']:.4f}")
 
+def stream_to(placeholder):
+    """Callback that renders streamed answer text into a placeholder as it arrives."""
+    parts = []
+
+    def on_token(text):
+        parts.append(text)
+        placeholder.markdown("".join(parts))
+
+    return on_token
+
 def handle_feedback(conversation_id):
     if conversation_id and not st.session_state['feedback_given'].get(conversation_id):
         st.subheader("Provide Feedback")
@@ -92,9 +125,14 @@ def display_recent_conversations():
         relevance_filter = st.selectbox(
             "Filter by relevance:", ["All", "RELEVANT", "PARTLY_RELEVANT", "NON_RELEVANT"]
         )
-        recent_conversations = get_recent_conversations(
-            limit=5, relevance=relevance_filter if relevance_filter != "All" else None
-        )
+        try:
+            recent_conversations = get_recent_conversations(
+                limit=5, relevance=relevance_filter if relevance_filter != "All" else None
+            )
+        except Exception as e:
+            logger.error(f"Error loading recent conversations: {e}")
+            st.warning("Recent conversations are unavailable.")
+            return
         for conv in recent_conversations:
             st.write(f"Q: {conv['question']}")
             st.write(f"A: {conv['answer']}")
@@ -103,11 +141,46 @@ def display_recent_conversations():
             st.write("---")
 
 def display_feedback_stats():
-    feedback_stats = get_feedback_stats()
+    try:
+        feedback_stats = get_feedback_stats()
+    except Exception as e:
+        logger.error(f"Error loading feedback statistics: {e}")
+        st.warning("Feedback statistics are unavailable.")
+        return
     st.subheader("Feedback Statistics")
     st.write(f"Thumbs up: {feedback_stats['thumbs_up']}")
     st.write(f"Thumbs down: {feedback_stats['thumbs_down']}")
 
+def display_resource_status():
+    if API_URL:
+        try:
+            health = api_client.get_health()
+        except Exception as e:
+            logger.error(f"Error loading API health: {e}")
+            st.sidebar.warning("API status is unavailable.")
+            return
+        resources, providers, coalescing = health['resources'], health['llm_providers'], health['coalescing']
+    else:
+        resources, providers, coalescing = resource_stats(), llm_client_stats(), coalescing_stats()
+    with st.sidebar.expander("Resource status"):
+        for name, stats in resources.items():
+            if stats['initialized']:
+                st.write(f"{name}: ready ({stats['init_time']:.2f}s to initialize)")
+            elif stats['error']:
+                st.write(f"{name}: unavailable ({stats['error']})")
+            else:
+                st.write(f"{name}: not loaded yet")
+    with st.sidebar.expander("LLM providers"):
+        for name, stats in providers.items():
+            st.write(
+                f"{name}: {stats['successes']}/{stats['requests']} ok, {stats['retries']} retries, "
+                f"{stats['rejected']} rejected, circuit {stats['circuit']}, p95 {stats['p95_ms']:.0f} ms"
+            )
+        st.write(
+            f"Coalesced requests: {coalescing['coalesced']} "
+            f"({coalescing['coalesced_rate']:.0%}), {coalescing['in_flight']} in flight"
+        )
+
 def main():
     logger.info("Starting the application")
     st.title("Research Knowledge Assistant")
@@ -115,6 +188,10 @@ def main():
     # Initialize session state
     initialize_session_state()
 
+    # Start the background judge once per process; it also resumes rows left PENDING
+    if not API_URL and EVALUATION_MODE == "async":
+        get_evaluator()
+
     # Get user input
     model_choice, search_type, user_input, submit_button = get_user_input()
 
@@ -124,17 +201,26 @@ def main():
             try:
                 logger.info(f"Getting answer from assistant using {model_choice} model and {search_type} search")
                 start_time = time.time()
-                answer_data = get_answer(user_input, model_choice, search_type)
+                on_token = stream_to(st.empty()) if STREAM_RESPONSES else None
+                conversation_id = st.session_state['current_conversation_id']
+                if API_URL:
+                    answer_data = api_client.get_answer(
+                        user_input, model_choice, search_type, conversation_id, on_token=on_token
+                    )
+                else:
+                    answer_data = get_answer(user_input, model_choice, search_type, on_token=on_token)
                 end_time = time.time()
                 logger.info(f"Answer received in {end_time - start_time:.2f} seconds")
                 
-                # Display answer
-                display_answer(answer_data)
+                # Display answer (already rendered incrementally when streaming)
+                display_answer(answer_data, show_answer=not STREAM_RESPONSES)
                 
-                # Save conversation to database
-                conversation_id = st.session_state['current_conversation_id']
-                logger.info(f"Saving conversation {conversation_id} to database")
-                save_conversation(conversation_id, user_input, answer_data)
+                # Save conversation to database (the API has already saved it)
+                if not API_URL:
+                    logger.info(f"Saving conversation {conversation_id} to database")
+                    save_conversation(conversation_id, user_input, answer_data)
+                    if answer_data["relevance"] == PENDING_RELEVANCE:
+                        schedule_evaluation(conversation_id, user_input, answer_data["answer"])
                 st.session_state['last_question'] = user_input
                 st.session_state['last_answer'] = answer_data
                 st.session_state['last_conversation_id'] = conversation_id
@@ -147,6 +233,10 @@ def main():
                 st.session_state['current_conversation_id'] = str(uuid.uuid4())
                 logger.info(f"Generated new current_conversation_id: {st.session_state['current_conversation_id']}")
 
+            except LLMError as e:
+                logger.error(f"Error getting answer: {e}")
+                st.error("The language model is currently unavailable. Please try again shortly.")
+                return
             except Exception as e:
                 logger.error(f"Error getting answer: {e}")
                 st.error("An error occurred while processing your request.")
@@ -168,5 +258,8 @@ def main():
     # Display feedback statistics
     display_feedback_stats()
 
+    # Display lazily initialized resources and their startup cost
+    display_resource_status()
+
 if __name__ == "__main__":
     main()
@@ -1,13 +1,34 @@
 import os
+import copy
 import time
 import json
+import random
+import asyncio
 import logging
+from contextlib import contextmanager
 
 from dotenv import load_dotenv
-from elasticsearch import Elasticsearch
-from sentence_transformers import SentenceTransformer
-from openai import OpenAI
-from groq import Groq  # Assuming there's a 'groq' Python package available
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+
+from resources import lazy_resource, warm_up_in_background
+from llm_clients import LLMError, get_provider
+from prompt_context import assemble_context, token_budget
+from latency_budget import LATENCY_BUDGET, LATENCY_TRIM_FRACTION, LatencyBudget, answer_key, observe
+from tracing import span, start_trace
+from cache import AsyncFlight, EmbeddingCache, SemanticAnswerCache, SingleFlight, normalize_query
+from embedding_store import EmbeddingStore
+from encoders import encoder_id, load_encoder
+from reranker import RERANKING, rerank as rerank_documents
+from benchmark_utils import parse_mapping
+from search_backend import (
+    DOCUMENTS_PATH,
+    HYBRID_SEARCH_PARAMS,
+    TEXT_SEARCH_PARAMS,
+    ElasticsearchBackend,
+    InMemoryBackend,
+    load_documents,
+    search_params,
+)
 
 # Load environment variables
 load_dotenv()
@@ -40,70 +61,209 @@ COST_RATES = {
 
 ELASTIC_URL = os.getenv("ELASTIC_URL", "http://localhost:9200")
 
-# Initialize Elasticsearch client
-es_client = Elasticsearch(ELASTIC_URL)
-
-# Initialize OpenAI client
-os.environ['OPENAI_API_KEY'] = OPENAI_API_KEY
-openai_client = OpenAI()
-
-# Initialize Groq client
-if GROQ_API_KEY:
-    client_groq = Groq(api_key=GROQ_API_KEY)
-    logger.info("Groq client initialized successfully.")
-else:
-    client_groq = None
-    logger.error("Groq API key missing. Unable to initialize Groq client.")
-
-# Load the SentenceTransformer model
+# Heavy clients and models are created on first use and shared by all sessions in the process
 model_name = 'multi-qa-MiniLM-L6-cos-v1'
-model = SentenceTransformer(model_name)
+encoder_name = encoder_id(model_name)  # Includes the ENCODER_BACKEND when it is not torch
+
+_es_client = lazy_resource("elasticsearch", lambda: Elasticsearch(ELASTIC_URL))
+_async_es_client = lazy_resource("elasticsearch_async", lambda: AsyncElasticsearch(ELASTIC_URL))
+_model = lazy_resource("sentence_transformer", lambda: load_encoder(model_name))
+
+def get_es_client():
+    return _es_client.get()
+
+def get_async_es_client():
+    return _async_es_client.get()
+
+def get_model():
+    return _model.get()
+
+# Query embedding cache shared across sessions and threads (0 disables it)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+query_embedding_cache = EmbeddingCache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+
+# Semantic answer cache: reuse answers to near-identical questions (size 0 disables it)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+answer_cache = SemanticAnswerCache(
+    maxsize=ANSWER_CACHE_SIZE, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL
+)
+
+# Concurrent identical questions (same normalized text, model and search type) share one computation
+ANSWER_COALESCING = os.getenv("ANSWER_COALESCING", "true").lower() == "true"
+answer_flights = SingleFlight()
+async_answer_flights = SingleFlight(AsyncFlight)
+
+# Usage fields of an answer that reused another request's work
+UNSPENT = {
+    'prompt_tokens': 0,
+    'completion_tokens': 0,
+    'total_tokens': 0,
+    'eval_prompt_tokens': 0,
+    'eval_completion_tokens': 0,
+    'eval_total_tokens': 0,
+    'openai_cost': 0,
+    'context_docs': 0,
+    'context_tokens': 0,
+}
+
+# Relevance evaluation: "sync" runs the judge inside get_answer, "async" leaves it to evaluator.py
+EVALUATION_MODE = os.getenv("EVALUATION_MODE", "sync")
+PENDING_RELEVANCE = "PENDING"
+# Share of live answers sent to the judge; the rest are saved as SKIPPED
+JUDGE_SAMPLE_RATE = float(os.getenv("JUDGE_SAMPLE_RATE", "1.0"))
+SKIPPED_RELEVANCE = "SKIPPED"
+JUDGE_MODEL = 'gpt-4o-mini'
+RELEVANCE_LABELS = ("NON_RELEVANT", "PARTLY_RELEVANT", "RELEVANT")
 
 # Elasticsearch index name
 INDEX_NAME = "insights-questions"
 
+# Search backend: "elasticsearch" (default) or "memory" for the embedded backend
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "elasticsearch")
+
+# Retrieval parameters per search type, e.g. VECTOR_SEARCH_PARAMS="num_candidates=100,top_n=5"
+SEARCH_PARAMS = {
+    'Vector': search_params(HYBRID_SEARCH_PARAMS, parse_mapping(os.getenv("VECTOR_SEARCH_PARAMS", ""))),
+    'Text': search_params(TEXT_SEARCH_PARAMS, parse_mapping(os.getenv("TEXT_SEARCH_PARAMS", ""))),
+}
+
+def create_search_backend(name):
+    if name == "memory":
+        return InMemoryBackend(load_documents(DOCUMENTS_PATH), get_model(), store=EmbeddingStore(encoder_name))
+    if name != "elasticsearch":
+        raise ValueError(f"Unknown search backend: {name}")
+    return ElasticsearchBackend(get_es_client(), INDEX_NAME, get_async_client=get_async_es_client)
+
+_search_backend = lazy_resource("search_backend", lambda: create_search_backend(SEARCH_BACKEND))
+
+def get_search_backend():
+    return _search_backend.get()
+
+# Optionally warm resources in the background so pods report ready before the model has loaded
+WARMUP_RESOURCES = [name for name in os.getenv("WARMUP_RESOURCES", "").split(",") if name]
+if WARMUP_RESOURCES:
+    warm_up_in_background(WARMUP_RESOURCES)
+
+OPENAI_MODELS = ['gpt-4o-mini']
+
+def provider_for(model_choice):
+    return get_provider('openai' if model_choice in OPENAI_MODELS else 'groq')
+
+def chat_request(prompt, model_choice, stream=False):
+    """Chat completion arguments, shared by the sync and async clients."""
+    request = {
+        'model': model_choice,  # e.g. 'gpt-4o-mini' or 'llama3-70b-8192'
+        'messages': [{"role": "user", "content": prompt}],
+    }
+    if stream:
+        request['stream'] = True
+        if model_choice in OPENAI_MODELS:
+            request['stream_options'] = {"include_usage": True}
+    return request
+
+def completion_result(response, start_time):
+    """(answer, tokens, response_time) of a non-streamed completion."""
+    return response.choices[0].message.content, usage_tokens(response.usage), time.time() - start_time
+
 def llm(prompt, model_choice):
-    """Handles interaction with OpenAI and Groq LLMs"""
+    """Handles interaction with OpenAI and Groq LLMs.
+
+    Raises LLMError when the provider keeps failing after retries.
+    """
     start_time = time.time()
-    try:
-        if model_choice in ['gpt-4o-mini']:  # OpenAI models
-            response = openai_client.chat.completions.create(
-                model=model_choice,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            answer = response.choices[0].message.content
-            tokens = {
-                'prompt_tokens': response.usage.prompt_tokens,
-                'completion_tokens': response.usage.completion_tokens,
-                'total_tokens': response.usage.total_tokens
-            }
-        elif client_groq:  # Use Groq client for Groq models
-            response = client_groq.chat.completions.create(
-                model=model_choice,  # e.g., 'llama3-70b-8192'
-                messages=[{"role": "user", "content": prompt}]
-            )
-            answer = response.choices[0].message.content
-            tokens = {
-                'prompt_tokens': getattr(response.usage, 'prompt_tokens', 0),
-                'completion_tokens': getattr(response.usage, 'completion_tokens', 0),
-                'total_tokens': getattr(response.usage, 'total_tokens', 0)
-            }
+    response = provider_for(model_choice).call(
+        lambda client: client.chat.completions.create(**chat_request(prompt, model_choice))
+    )
+    return completion_result(response, start_time)
 
-        else:
-            raise ValueError(f"Groq API key not found, unable to use model: {model_choice}")
-    except Exception as e:
-        logger.error(f"Error during LLM request: {e}")
-        answer, tokens = "Error generating response", {}
-    
-    end_time = time.time()
-    response_time = end_time - start_time
-    return answer, tokens, response_time
-
-def build_prompt(query, search_results):
-    context = "\n\n".join(
-        f"Category: {doc.get('Category', '')}\nQuestion: {doc.get('Question', '')}\nAnswer: {doc.get('Answer', '')}"
-        for doc in search_results
+def usage_tokens(usage):
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', 0),
+        'completion_tokens': getattr(usage, 'completion_tokens', 0),
+        'total_tokens': getattr(usage, 'total_tokens', 0)
+    }
+
+
+class StreamedCompletion:
+    """Text, token usage and time to first token collected from a completion's chunks."""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.first_token_time = None
+        self.parts = []
+        self.tokens = {}
+
+    def add(self, chunk):
+        """Record a chunk; returns its text delta (or None) to pass on."""
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            if self.first_token_time is None:
+                self.first_token_time = time.time() - self.start_time
+            self.parts.append(delta)
+        # OpenAI sends usage on the final chunk; Groq reports it under x_groq
+        usage = getattr(chunk, 'usage', None) or getattr(getattr(chunk, 'x_groq', None), 'usage', None)
+        if usage:
+            self.tokens = usage_tokens(usage)
+        return delta
+
+    def can_retry(self):
+        # Nothing has been passed on yet, so a retry cannot repeat text
+        return not self.parts
+
+    def result(self):
+        """(answer, tokens, response_time, first_token_time)."""
+        response_time = time.time() - self.start_time
+        first_token_time = response_time if self.first_token_time is None else self.first_token_time
+        return "".join(self.parts), self.tokens, response_time, first_token_time
+
+
+def llm_stream(prompt, model_choice, on_token):
+    """Streams a completion, passing each text delta to on_token.
+
+    Returns the answer, token usage, total response time and time to first token.
+    A failed request is retried only until the first token has been passed on.
+    """
+    completion = StreamedCompletion()
+
+    def stream_completion(client):
+        for chunk in client.chat.completions.create(**chat_request(prompt, model_choice, stream=True)):
+            delta = completion.add(chunk)
+            if delta:
+                on_token(delta)
+
+    provider_for(model_choice).call(stream_completion, can_retry=completion.can_retry)
+    return completion.result()
+
+async def llm_async(prompt, model_choice):
+    """llm for the event loop."""
+    start_time = time.time()
+    response = await provider_for(model_choice).call_async(
+        lambda client: client.chat.completions.create(**chat_request(prompt, model_choice))
     )
+    return completion_result(response, start_time)
+
+async def llm_stream_async(prompt, model_choice, on_token):
+    """llm_stream for the event loop; on_token is a coroutine function."""
+    completion = StreamedCompletion()
+
+    async def stream_completion(client):
+        async for chunk in await client.chat.completions.create(**chat_request(prompt, model_choice, stream=True)):
+            delta = completion.add(chunk)
+            if delta:
+                await on_token(delta)
+
+    await provider_for(model_choice).call_async(stream_completion, can_retry=completion.can_retry)
+    return completion.result()
+
+def build_prompt(query, search_results, model_choice=None):
+    prompt, _ = assemble_prompt(query, search_results, model_choice)
+    return prompt
+
+def assemble_prompt(query, search_results, model_choice=None, budget=None):
+    """Prompt with the retrieved context fitted to the model's token budget, plus context stats."""
+    context, context_stats = assemble_context(search_results, model_choice, budget=budget)
     prompt = f"""
 You're an expert in market research studies. Answer the QUESTION based on the CONTEXT from the FAQ database.
 Use only the facts from the CONTEXT when answering the QUESTION.
@@ -113,91 +273,48 @@ QUESTION: {query}
 CONTEXT:
 {context}
 """.strip()
-    return prompt
+    return prompt, context_stats
 
-def compute_rrf(rank, k=60):
-    """Compute Reciprocal Rank Fusion score."""
-    return 1 / (k + rank)
-
-def elastic_search_hybrid_rrf(field, query, vector, k=60):
-    # KNN Query
-    knn_query = {
-        "field": field,
-        "query_vector": vector,
-        "k": 10,
-        "num_candidates": 10000,
-        "boost": 0.5
-    }
+def elastic_search_hybrid_rrf(field, query, vector, params=None):
+    """Hybrid kNN + keyword search fused with RRF on the configured backend."""
+    return get_search_backend().hybrid_search(field, query, vector, params or SEARCH_PARAMS['Vector'])
 
-    # Keyword Query
-    keyword_query = {
-        "bool": {
-            "must": {
-                "multi_match": {
-                    "query": query,
-                    "fields": ["Question", "Answer", "Category"],
-                    "type": "best_fields",
-                    "boost": 0.5
-                }
-            }
-        }
-    }
+def encode_query(query):
+    """Embed a query, reusing cached vectors for repeated questions."""
+    with span("query_encoding"):
+        return query_embedding_cache.get_or_compute(query, encoder_name, get_model().encode)
 
-    # KNN Search
-    knn_results = es_client.search(
-        index=INDEX_NAME,
-        body={"knn": knn_query, "size": 10}
-    )['hits']['hits']
-
-    # Keyword Search
-    keyword_results = es_client.search(
-        index=INDEX_NAME,
-        body={"query": keyword_query, "size": 10}
-    )['hits']['hits']
-
-    # Reciprocal Rank Fusion (RRF) scoring
-    rrf_scores = {}
-    for rank, hit in enumerate(knn_results):
-        doc_id = hit['_id']
-        rrf_scores[doc_id] = compute_rrf(rank + 1, k)
-
-    for rank, hit in enumerate(keyword_results):
-        doc_id = hit['_id']
-        if doc_id in rrf_scores:
-            rrf_scores[doc_id] += compute_rrf(rank + 1, k)
-        else:
-            rrf_scores[doc_id] = compute_rrf(rank + 1, k)
+def search_elasticsearch(query, search_type, params=None, rerank=None):
+    """Retrieve documents; params overrides SEARCH_PARAMS for the search type (e.g. in a sweep).
 
-    reranked_docs = sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)
-    final_results = [es_client.get(index=INDEX_NAME, id=doc_id)['_source'] for doc_id, _ in reranked_docs[:5]]
-    
-    return final_results
+    With rerank (default RERANKING), the retrieved candidates are reordered by
+    the cross-encoder and cut to RERANK_TOP_N.
+    """
+    params = params or SEARCH_PARAMS[search_type]
+    if search_type == 'Vector':
+        vector = encode_query(query)
+        search_results = elastic_search_hybrid_rrf('question_text_vector', query, vector, params)
+    else:
+        search_results = get_search_backend().keyword_search(query, size=params['size'])
+    if (RERANKING if rerank is None else rerank) and search_results:
+        search_results = rerank_documents(query, search_results)
+    return search_results
 
-def search_elasticsearch(query, search_type):
+async def search_async(query, search_type, params=None, rerank=None):
+    """search_elasticsearch for the event loop; encoding and reranking run on worker threads."""
+    params = params or SEARCH_PARAMS[search_type]
+    backend = await asyncio.to_thread(get_search_backend)
     if search_type == 'Vector':
-        vector = model.encode(query)
-        search_results = elastic_search_hybrid_rrf('question_text_vector', query, vector)
+        vector = await asyncio.to_thread(encode_query, query)
+        search_results = await backend.hybrid_search_async('question_text_vector', query, vector, params)
     else:
-        keyword_query = {
-            "size": 5,
-            "query": {
-                "bool": {
-                    "must": {
-                        "multi_match": {
-                            "query": query,
-                            "fields": ["Question^3", "Answer", "Category"],
-                            "type": "best_fields",
-                        }
-                    }
-                },
-            }
-        }
-        response = es_client.search(index=INDEX_NAME, body=keyword_query)
-        search_results = [hit["_source"] for hit in response["hits"]["hits"]]
+        search_results = await backend.keyword_search_async(query, size=params['size'])
+    if (RERANKING if rerank is None else rerank) and search_results:
+        search_results = await asyncio.to_thread(rerank_documents, query, search_results)
     return search_results
 
-def evaluate_relevance(question, answer):
-    prompt = f"""
+def relevance_prompt(question, answer):
+    return f"""
 You are an expert evaluator for a Retrieval-Augmented Generation (RAG) system.
 Your task is to analyze the relevance of the generated answer to the given question.
 Based on the relevance of the generated answer, you will classify it
@@ -216,15 +333,26 @@ and provide your evaluation in parsable JSON without using code blocks:
   "Explanation": "[Provide a brief explanation for your evaluation]"
 }}
 """.strip()
-    evaluation, tokens, _ = llm(prompt, 'gpt-4o-mini')
+
+def evaluate_relevance(question, answer):
+    evaluation, tokens, _ = llm(relevance_prompt(question, answer), JUDGE_MODEL)
+    relevance, explanation = parse_evaluation(evaluation)
+    return relevance, explanation, tokens
+
+async def evaluate_relevance_async(question, answer):
+    evaluation, tokens, _ = await llm_async(relevance_prompt(question, answer), JUDGE_MODEL)
+    relevance, explanation = parse_evaluation(evaluation)
+    return relevance, explanation, tokens
+
+def parse_evaluation(evaluation):
+    """Relevance and explanation from the judge's JSON reply."""
     try:
         json_eval = json.loads(evaluation)
         relevance = json_eval.get('Relevance', 'UNKNOWN')
         explanation = json_eval.get('Explanation', 'No explanation provided.')
     except json.JSONDecodeError:
         relevance, explanation = "UNKNOWN", "Failed to parse evaluation"
-    
-    return relevance, explanation, tokens
+    return relevance, explanation
 
 def calculate_openai_cost(model_choice, tokens):
     cost = 0
@@ -233,15 +361,285 @@ def calculate_openai_cost(model_choice, tokens):
         cost = (tokens['prompt_tokens'] * rates['prompt'] + tokens['completion_tokens'] * rates['completion']) / 1000
     return cost
 
-def get_answer(query, model_choice, search_type):
-    search_results = search_elasticsearch(query, search_type)
-    prompt = build_prompt(query, search_results)
-    answer, tokens, response_time = llm(prompt, model_choice)
-    relevance, explanation, eval_tokens = evaluate_relevance(query, answer)
+def get_cached_answer(query, model_choice, search_type, start_time):
+    """Return a cached answer for a semantically identical question, or None."""
+    if answer_cache.maxsize <= 0:
+        return None
+    vector = encode_query(query)
+    with span("answer_cache_lookup"):
+        cached = answer_cache.lookup(vector, model_choice, search_type)
+    if cached is None:
+        return None
+    answer_data, similarity = cached
+    logger.info(f"Answer cache hit (similarity {similarity:.3f})")
+    # Nothing was spent on this request; only the answer and its relevance are reused
+    response_time = time.time() - start_time
+    answer_data.update(UNSPENT, response_time=response_time, first_token_time=response_time, cache_hit=True)
+    if answer_data['relevance'] == PENDING_RELEVANCE:
+        # The original row is judged in the background; judging every hit would multiply the spend
+        answer_data['relevance'] = SKIPPED_RELEVANCE
+        answer_data['relevance_explanation'] = "Reused from the answer cache before it was judged"
+    return answer_data
+
+def coalesced_answer(shared, start_time, first_token_time=None):
+    """A follower's own copy of the answer computed by a concurrent identical request."""
+    answer_data = copy.deepcopy(shared)
+    response_time = time.time() - start_time
+    answer_data.update(
+        UNSPENT, response_time=response_time, first_token_time=first_token_time or response_time, coalesced=True,
+        stage_timings={'coalesced_wait': response_time * 1000},
+    )
+    if answer_data['relevance'] == PENDING_RELEVANCE:
+        # The leader's row is judged; judging identical copies would multiply the spend again
+        answer_data['relevance'] = SKIPPED_RELEVANCE
+        answer_data['relevance_explanation'] = "Shared with a concurrent identical question"
+    return answer_data
+
+def shared_error(error):
+    """The error followers re-raise when the leader's computation failed or was interrupted."""
+    if isinstance(error, Exception):
+        return error
+    return LLMError(f"The shared request for this question was interrupted ({type(error).__name__})")
+
+def flight_key(query, model_choice, search_type):
+    return normalize_query(query), model_choice, search_type
+
+def coalescing_stats():
+    """Requests that computed an answer (leaders) and requests that shared one (coalesced)."""
+    stats = answer_flights.stats()
+    for key, value in async_answer_flights.stats().items():
+        stats[key] += value
+    requests = stats['leaders'] + stats['coalesced']
+    stats['coalesced_rate'] = stats['coalesced'] / requests if requests else 0.0
+    return stats
+
+class FirstTokenClock:
+    """Time until a coalesced follower passes on its first token."""
+
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.first_token_time = None
+
+    def mark(self):
+        if self.first_token_time is None:
+            self.first_token_time = time.time() - self.start_time
+
+
+def get_answer(query, model_choice, search_type, on_token=None):
+    """Answer a question; when on_token is given the completion is streamed to it.
+
+    Per-stage durations are returned in milliseconds under 'stage_timings'.
+    A request that arrives while an identical one is in flight waits for it
+    and returns its own copy of that answer, marked 'coalesced'.
+    """
+    if not ANSWER_COALESCING:
+        return compute_answer(query, model_choice, search_type, on_token)
+    start_time = time.time()
+    key = flight_key(query, model_choice, search_type)
+    flight, leader = answer_flights.join(key)
+    if not leader:
+        clock = FirstTokenClock(start_time)
+
+        def follow_token(text):
+            clock.mark()
+            on_token(text)
+
+        shared = flight.follow(follow_token if on_token else None)
+        if on_token and clock.first_token_time is None:
+            follow_token(shared['answer'])
+        return coalesced_answer(shared, start_time, clock.first_token_time)
+
+    def publish_token(text):
+        flight.publish(text)
+        on_token(text)
+
+    try:
+        answer_data = compute_answer(query, model_choice, search_type, publish_token if on_token else None)
+    except BaseException as e:
+        answer_flights.release(key, flight)
+        flight.finish(error=shared_error(e))
+        raise
+    answer_flights.release(key, flight)
+    flight.finish(result=copy.deepcopy(answer_data))
+    return answer_data
+
+def compute_answer(query, model_choice, search_type, on_token=None):
+    with start_trace() as trace:
+        answer_data = answer_question(query, model_choice, search_type, on_token)
+    answer_data['stage_timings'] = trace.timings()
+    return answer_data
+
+def answer_question(query, model_choice, search_type, on_token=None):
+    """The answer pipeline; the steps are shared with answer_question_async, only the I/O differs."""
+    start_time = time.time()
+    cached = get_cached_answer(query, model_choice, search_type, start_time)
+    if cached is not None:
+        if on_token:
+            on_token(cached['answer'])
+        return cached
+
+    evaluation, budget = plan_answer(model_choice, search_type, start_time)
+    with search_stage(budget):
+        search_results = search_elasticsearch(query, budget.search_type_used)
+    prompt, context_stats = prepare_prompt(query, search_results, budget)
+    with answer_stage(budget):
+        if on_token:
+            completion = llm_stream(prompt, budget.model_used, on_token)
+        else:
+            # Without streaming nothing is shown until the whole completion arrives
+            completion = unstreamed(llm(prompt, budget.model_used))
+    evaluation = planned_evaluation(evaluation, budget)
+    if evaluation is None:
+        with judge_stage():
+            try:
+                evaluation = evaluate_relevance(query, completion[0])
+            except LLMError as e:
+                evaluation = failed_evaluation(e)
+    answer_data = build_answer_data(*completion, evaluation, budget.model_used, context_stats, budget.applied)
+    cache_answer(query, model_choice, search_type, answer_data)
+    return answer_data
+
+async def get_answer_async(query, model_choice, search_type, on_token=None):
+    """get_answer for the event loop; on_token, when given, is a coroutine function.
+
+    Elasticsearch and LLM requests are awaited; query encoding and cache
+    lookups run on worker threads. Identical concurrent requests on the loop
+    are coalesced like in get_answer.
+    """
+    if not ANSWER_COALESCING:
+        return await compute_answer_async(query, model_choice, search_type, on_token)
+    start_time = time.time()
+    key = flight_key(query, model_choice, search_type)
+    flight, leader = async_answer_flights.join(key)
+    if not leader:
+        clock = FirstTokenClock(start_time)
+
+        async def follow_token(text):
+            clock.mark()
+            await on_token(text)
+
+        shared = await flight.follow(follow_token if on_token else None)
+        if on_token and clock.first_token_time is None:
+            await follow_token(shared['answer'])
+        return coalesced_answer(shared, start_time, clock.first_token_time)
+
+    async def publish_token(text):
+        await flight.publish(text)
+        await on_token(text)
+
+    try:
+        answer_data = await compute_answer_async(query, model_choice, search_type, publish_token if on_token else None)
+    except BaseException as e:
+        # Includes cancellation (e.g. the leader's client disconnected), so followers never wait forever
+        async_answer_flights.release(key, flight)
+        await flight.finish(error=shared_error(e))
+        raise
+    async_answer_flights.release(key, flight)
+    await flight.finish(result=copy.deepcopy(answer_data))
+    return answer_data
+
+async def compute_answer_async(query, model_choice, search_type, on_token=None):
+    with start_trace() as trace:
+        answer_data = await answer_question_async(query, model_choice, search_type, on_token)
+    answer_data['stage_timings'] = trace.timings()
+    return answer_data
+
+async def answer_question_async(query, model_choice, search_type, on_token=None):
+    start_time = time.time()
+    cached = await asyncio.to_thread(get_cached_answer, query, model_choice, search_type, start_time)
+    if cached is not None:
+        if on_token:
+            await on_token(cached['answer'])
+        return cached
+
+    evaluation, budget = plan_answer(model_choice, search_type, start_time)
+    with search_stage(budget):
+        search_results = await search_async(query, budget.search_type_used)
+    prompt, context_stats = prepare_prompt(query, search_results, budget)
+    with answer_stage(budget):
+        if on_token:
+            completion = await llm_stream_async(prompt, budget.model_used, on_token)
+        else:
+            completion = unstreamed(await llm_async(prompt, budget.model_used))
+    evaluation = planned_evaluation(evaluation, budget)
+    if evaluation is None:
+        with judge_stage():
+            try:
+                evaluation = await evaluate_relevance_async(query, completion[0])
+            except LLMError as e:
+                evaluation = failed_evaluation(e)
+    answer_data = build_answer_data(*completion, evaluation, budget.model_used, context_stats, budget.applied)
+    await asyncio.to_thread(cache_answer, query, model_choice, search_type, answer_data)
+    return answer_data
+
+def plan_answer(model_choice, search_type, start_time):
+    """The deferred evaluation (None to judge inline) and the latency budget, planned for search."""
+    evaluation = deferred_evaluation()
+    budget = LatencyBudget(LATENCY_BUDGET, model_choice, search_type, evaluation is None, start_time)
+    budget.plan("search")
+    return evaluation, budget
+
+def search_stage(budget):
+    return observe(search_key(budget.search_type_used))
+
+def prepare_prompt(query, search_results, budget):
+    """Apply the prompt-stage degradations and build the prompt; returns (prompt, context_stats)."""
+    budget.plan("prompt")
+    with span("prompt_build"):
+        return assemble_prompt(query, search_results, budget.model_used, context_budget(budget))
+
+@contextmanager
+def answer_stage(budget):
+    with span("answer_llm"), observe(answer_key(budget.model_used, budget.trimmed)):
+        yield
+
+def unstreamed(completion):
+    """llm's (answer, tokens, response_time) with the first token arriving with the rest."""
+    answer, tokens, response_time = completion
+    return answer, tokens, response_time, response_time
+
+def planned_evaluation(evaluation, budget):
+    """The evaluation to save, or None when the judge should run inline now."""
+    if evaluation is None and budget.plan("judge"):
+        return SKIPPED_RELEVANCE, "Skipped to meet the latency budget", {}
+    return evaluation
+
+@contextmanager
+def judge_stage():
+    with span("judge_llm"), observe("judge_llm"):
+        yield
+
+def failed_evaluation(error):
+    # Keep the answer; only its rating is missing
+    logger.error(f"Relevance evaluation failed: {error}")
+    return "UNKNOWN", "Evaluation failed", {}
+
+def deferred_evaluation():
+    """(relevance, explanation, eval_tokens) when the judge is not run inline, else None."""
+    if random.random() >= JUDGE_SAMPLE_RATE:
+        return SKIPPED_RELEVANCE, "Not sampled for evaluation", {}
+    if EVALUATION_MODE == "async":
+        # The conversation is saved as PENDING and judged in the background
+        return PENDING_RELEVANCE, "Evaluation pending", {}
+    return None
+
+def search_key(search_type):
+    return "vector_search" if search_type == 'Vector' else "keyword_search"
+
+def context_budget(budget):
+    """Context token budget for the answer model, or None for its configured default."""
+    if not budget.trimmed:
+        return None
+    return int(token_budget(budget.model_used) * LATENCY_TRIM_FRACTION)
+
+def build_answer_data(answer, tokens, response_time, first_token_time, evaluation, model_choice, context_stats,
+                      degradations=()):
+    relevance, explanation, eval_tokens = evaluation
     openai_cost = calculate_openai_cost(model_choice, tokens)
     return {
         'answer': answer,
         'response_time': response_time,
+        'first_token_time': first_token_time,
         'relevance': relevance,
         'relevance_explanation': explanation,
         'model_used': model_choice,
@@ -251,5 +649,19 @@ def get_answer(query, model_choice, search_type):
         'eval_prompt_tokens': eval_tokens.get('prompt_tokens', 0),
         'eval_completion_tokens': eval_tokens.get('completion_tokens', 0),
         'eval_total_tokens': eval_tokens.get('total_tokens', 0),
-        'openai_cost': openai_cost
+        'openai_cost': openai_cost,
+        'cache_hit': False,
+        'coalesced': False,
+        'context_docs': context_stats['context_docs'],
+        'context_tokens': context_stats['context_tokens'],
+        'degradations': list(degradations),
     }
+
+def cache_answer(query, model_choice, search_type, answer_data):
+    # Answers without usage data, or degraded to meet the latency budget, are not cached
+    if answer_data['total_tokens'] and not answer_data['degradations'] and answer_cache.maxsize > 0:
+        answer_cache.store(encode_query(query), model_choice, search_type, answer_data)
+
+def record_judged_relevance(answer, relevance, explanation):
+    """Give cached copies of a background-judged answer its relevance, so later hits reuse it."""
+    answer_cache.update_relevance(answer, PENDING_RELEVANCE, relevance, explanation)
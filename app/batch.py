@@ -0,0 +1,324 @@
+"""Answer (and judge) many questions concurrently, e.g. the ground-truth set for offline evaluation.
+
+Each finished question is appended to a JSONL checkpoint, so an interrupted
+run resumes where it stopped. At the end (or on Ctrl-C) the checkpoint is
+written out as the results and evaluations CSVs used in Evaluation/LLM Evaluation.
+
+Example:
+    python batch.py --model llama3-8b-8192 --judge qa --output-prefix llm_data/llama8b
+"""
+import os
+import csv
+import json
+import time
+import argparse
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tqdm import tqdm
+
+from assistant import (
+    DOCUMENTS_PATH,
+    JUDGE_MODEL,
+    assemble_prompt,
+    calculate_openai_cost,
+    evaluate_relevance,
+    llm,
+    parse_evaluation,
+    provider_for,
+    search_elasticsearch,
+)
+from benchmark_utils import GROUND_TRUTH_PATH, load_ground_truth, parse_mapping
+from judge import JUDGE_BATCH_SIZE, evaluate_relevance_batch
+from llm_clients import LLMError
+from search_backend import load_documents
+
+logger = logging.getLogger(__name__)
+
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "16"))
+# In-flight LLM requests and requests per minute per provider (0 disables the rate limit)
+BATCH_CONCURRENCY = parse_mapping(os.getenv("BATCH_CONCURRENCY", "openai=8,groq=4"))
+BATCH_RATE_LIMITS = parse_mapping(os.getenv("BATCH_RATE_LIMITS", "openai=500,groq=30"))
+
+RESULT_COLUMNS = ['answer_llm', 'answer_orig', 'document', 'question', 'category']
+EVALUATION_COLUMNS = ['Relevance', 'Explanation']
+
+# Judge comparing the generated answer with the original FAQ answer ("aqa" in LLM_judge.ipynb)
+AQA_JUDGE_PROMPT = """
+You are an expert evaluator for a Retrieval-Augmented Generation (RAG) system.
+Your task is to analyze the relevance of the generated answer compared to the original answer provided.
+Based on the relevance and similarity of the generated answer to the original answer, you will classify
+it as "NON_RELEVANT", "PARTLY_RELEVANT", or "RELEVANT".
+
+Here is the data for evaluation:
+
+Original Answer: {answer_orig}
+Generated Question: {question}
+Generated Answer: {answer_llm}
+
+Please analyze the content and context of the generated answer in relation to the original
+answer and provide your evaluation in parsable JSON without using code blocks:
+
+{{
+  "Relevance": "NON_RELEVANT" | "PARTLY_RELEVANT" | "RELEVANT",
+  "Explanation": "[Provide a brief explanation for your evaluation]"
+}}
+""".strip()
+
+
+class RateLimiter:
+    """Spaces requests evenly to at most `per_minute` per minute across threads."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._next - now)
+            self._next = max(now, self._next) + self.interval
+        if wait:
+            time.sleep(wait)
+
+
+class ProviderThrottle:
+    """Bounds one provider's in-flight requests and request rate."""
+
+    def __init__(self, concurrency, per_minute):
+        self.semaphore = threading.BoundedSemaphore(max(1, concurrency))
+        self.limiter = RateLimiter(per_minute)
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        self.limiter.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.semaphore.release()
+        return False
+
+
+def create_throttles(concurrency=None, rate_limits=None):
+    concurrency = {**BATCH_CONCURRENCY, **(concurrency or {})}
+    rate_limits = {**BATCH_RATE_LIMITS, **(rate_limits or {})}
+    return {
+        name: ProviderThrottle(concurrency.get(name, 4), rate_limits.get(name, 0))
+        for name in set(concurrency) | set(rate_limits) | {'openai', 'groq'}
+    }
+
+def load_checkpoint(path):
+    """Latest checkpointed result per index, as written by answer_batch."""
+    results = {}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A line cut short by an interrupted run
+                results[result['index']] = result
+    return results
+
+def answer_record(index, record, model_choice, search_type, judge, throttles):
+    """Retrieve, generate and (optionally) judge one question; never raises."""
+    result = {
+        'index': index,
+        'answer_llm': None,
+        'answer_orig': record.get('answer_orig', ''),
+        'document': record.get('document', ''),
+        'question': record['question'],
+        'category': record.get('category', ''),
+        'model_used': model_choice,
+        'Relevance': None,
+        'Explanation': None,
+        'error': None,
+    }
+    try:
+        search_results = search_elasticsearch(record['question'], search_type)
+        prompt, context_stats = assemble_prompt(record['question'], search_results, model_choice)
+        with throttles[provider_for(model_choice).name]:
+            answer, tokens, response_time = llm(prompt, model_choice)
+        result.update({
+            'answer_llm': answer,
+            'response_time': response_time,
+            'prompt_tokens': tokens.get('prompt_tokens', 0),
+            'completion_tokens': tokens.get('completion_tokens', 0),
+            'total_tokens': tokens.get('total_tokens', 0),
+            'openai_cost': calculate_openai_cost(model_choice, tokens),
+            **context_stats,
+        })
+        if judge:
+            with throttles[provider_for(JUDGE_MODEL).name]:
+                if judge == 'aqa':
+                    evaluation, eval_tokens, _ = llm(AQA_JUDGE_PROMPT.format(**result), JUDGE_MODEL)
+                    relevance, explanation = parse_evaluation(evaluation)
+                else:
+                    relevance, explanation, eval_tokens = evaluate_relevance(record['question'], answer)
+            result.update({
+                'Relevance': relevance,
+                'Explanation': explanation,
+                'eval_total_tokens': eval_tokens.get('total_tokens', 0),
+            })
+    except LLMError as e:
+        result['error'] = str(e)
+    except Exception as e:
+        logger.error(f"Error answering question {index}: {e}")
+        result['error'] = str(e)
+    return result
+
+def judge_results(results, throttles):
+    """Score answered results with one batched judge request ('qa' judge)."""
+    judged = [dict(result) for result in results]
+    try:
+        with throttles[provider_for(JUDGE_MODEL).name]:
+            evaluations = evaluate_relevance_batch(
+                [(result['question'], result['answer_llm']) for result in judged], batch_size=len(judged)
+            )
+    except LLMError as e:
+        # The answers stay valid; the next run judges them again
+        for result in judged:
+            result['judge_error'] = str(e)
+        return judged
+    for result, (relevance, explanation, eval_tokens) in zip(judged, evaluations):
+        result.update({
+            'Relevance': relevance,
+            'Explanation': explanation,
+            'eval_total_tokens': eval_tokens.get('total_tokens', 0),
+            'judge_error': None,
+        })
+    return judged
+
+def run_tasks(tasks, workers, desc, done, checkpoint):
+    """Run callables that each return a list of results, recording and checkpointing them as they finish."""
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(task) for task in tasks]
+        for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+            for result in future.result():
+                done[result['index']] = result
+                if checkpoint:
+                    checkpoint.write(json.dumps(result) + "\n")
+                    checkpoint.flush()
+    finally:
+        # On Ctrl-C, drop queued work instead of finishing it first
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def answer_batch(records, model_choice, search_type='Vector', judge='qa', checkpoint_path=None,
+                 workers=BATCH_WORKERS, concurrency=None, rate_limits=None, judge_batch_size=JUDGE_BATCH_SIZE):
+    """Answer a list of questions concurrently and return one result dict per question, in order.
+
+    `records` are question strings or dicts with 'question' and optionally
+    'document', 'category' and 'answer_orig'. `judge` is 'qa' (the live
+    relevance judge), 'aqa' (compare with answer_orig) or None. The 'qa' judge
+    scores judge_batch_size answers per request once they are all answered.
+    With a checkpoint_path, results are appended there as JSONL; on the next
+    call, answered questions are skipped and only missing judgements redone.
+    """
+    records = [{'question': r} if isinstance(r, str) else r for r in records]
+    done = {
+        i: r for i, r in load_checkpoint(checkpoint_path).items()
+        if not r.get('error') and r.get('answer_llm') is not None and i < len(records)
+    }
+    if done:
+        logger.info(f"Resuming: {len(done)} of {len(records)} questions already answered")
+    throttles = create_throttles(concurrency, rate_limits)
+    batch_judge = judge == 'qa' and judge_batch_size > 1
+    answer_judge = None if batch_judge else judge
+
+    checkpoint = open(checkpoint_path, 'a') if checkpoint_path else None
+    try:
+        pending = [i for i in range(len(records)) if i not in done]
+        run_tasks(
+            [
+                lambda i=i: [answer_record(i, records[i], model_choice, search_type, answer_judge, throttles)]
+                for i in pending
+            ],
+            workers, model_choice, done, checkpoint,
+        )
+        if batch_judge:
+            unjudged = [r for i, r in sorted(done.items()) if not r.get('error') and r.get('Relevance') is None]
+            chunks = [unjudged[start:start + judge_batch_size] for start in range(0, len(unjudged), judge_batch_size)]
+            run_tasks(
+                [lambda chunk=chunk: judge_results(chunk, throttles) for chunk in chunks],
+                workers, "judge", done, checkpoint,
+            )
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    failed = sum(1 for r in done.values() if r.get('error'))
+    unjudged = sum(1 for r in done.values() if judge and not r.get('error') and r.get('Relevance') is None)
+    if failed or unjudged:
+        logger.warning(f"{failed} questions failed and {unjudged} answers are unjudged; run again to retry them")
+    judged = [r for r in done.values() if r.get('Relevance') is not None]
+    if judged:
+        tokens_per_answer = sum(r.get('eval_total_tokens', 0) for r in judged) / len(judged)
+        logger.info(f"Judge tokens per evaluated answer: {tokens_per_answer:.1f}")
+    return [done[i] for i in sorted(done)]
+
+def write_csv(path, results, columns):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
+    logger.info(f"Wrote {len(results)} rows to {path}")
+
+def ground_truth_records(path, limit=None):
+    """Ground-truth questions with the original answer of their expected document."""
+    answers = {doc['doc_id']: doc['Answer'] for doc in load_documents(DOCUMENTS_PATH)}
+    records = load_ground_truth(path, limit=limit)
+    for record in records:
+        record['answer_orig'] = answers.get(record['document'], '')
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-answer the ground-truth questions for offline evaluation.")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--search-type", choices=["Text", "Vector"], default="Vector")
+    parser.add_argument("--judge", choices=["qa", "aqa", "none"], default="qa")
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH, help="Ground-truth questions CSV")
+    parser.add_argument("--queries", type=int, default=None, help="Limit the number of ground-truth questions")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--judge-batch-size", type=int, default=JUDGE_BATCH_SIZE,
+                        help="Answers scored per judge request with --judge qa (1 = one request per answer)")
+    parser.add_argument("--concurrency", default="", help='Per-provider in-flight requests, e.g. "openai=8,groq=4"')
+    parser.add_argument("--rate-limits", default="", help='Per-provider requests per minute, e.g. "openai=500,groq=30"')
+    parser.add_argument("--output-prefix", default="batch_results",
+                        help="Writes <prefix>.jsonl (checkpoint), <prefix>-results.csv and <prefix>-evaluations.csv")
+    args = parser.parse_args()
+
+    records = ground_truth_records(args.ground_truth, limit=args.queries)
+    checkpoint_path = f"{args.output_prefix}.jsonl"
+    judge = None if args.judge == "none" else args.judge
+    try:
+        results = answer_batch(
+            records, args.model, search_type=args.search_type, judge=judge, checkpoint_path=checkpoint_path,
+            workers=args.workers, concurrency=parse_mapping(args.concurrency),
+            rate_limits=parse_mapping(args.rate_limits), judge_batch_size=args.judge_batch_size,
+        )
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; writing what has been answered so far")
+        checkpointed = load_checkpoint(checkpoint_path)
+        results = [checkpointed[i] for i in sorted(checkpointed)]
+
+    answered = [r for r in results if not r.get('error')]
+    write_csv(f"{args.output_prefix}-results.csv", answered, RESULT_COLUMNS)
+    if judge:
+        write_csv(f"{args.output_prefix}-evaluations.csv", answered, EVALUATION_COLUMNS)
+    print(f"Answered {len(answered)} of {len(records)} questions ({len(results) - len(answered)} failed)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
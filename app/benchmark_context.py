@@ -0,0 +1,78 @@
+"""Measure prompt context size against token budgets on the ground-truth questions.
+
+For each budget, reports the mean context documents and tokens per prompt and
+how often the expected document is still in the context. No LLM is called; the
+unbudgeted run (budget 0) is the previous build_prompt behaviour. With
+--rerank off on, each budget is measured on plain and on reranked retrieval.
+
+Examples:
+    python benchmark_context.py --backend memory --budgets 0 500 1000 1500 --model gpt-4o-mini
+    python benchmark_context.py --backend memory --budgets 0 --rerank off on
+"""
+import os
+import argparse
+import logging
+
+from benchmark_utils import GROUND_TRUTH_PATH, configure_before_import, load_ground_truth, write_json
+from prompt_context import assemble_context, count_tokens, format_entry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt context size and recall per token budget.")
+    parser.add_argument("--backend", choices=["elasticsearch", "memory"], default=os.getenv("SEARCH_BACKEND", "elasticsearch"))
+    parser.add_argument("--search-type", choices=["Text", "Vector"], default="Vector")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[0, 500, 1000, 1500], help="Token budgets; 0 means unlimited")
+    parser.add_argument("--model", default="gpt-4o-mini", help="Model whose tokenizer is used")
+    parser.add_argument("--rerank", nargs="+", choices=["off", "on"], default=["off"],
+                        help="Retrieve without and/or with the cross-encoder reranking stage")
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH, help="Ground-truth questions CSV")
+    parser.add_argument("--queries", type=int, default=None, help="Limit the number of ground-truth questions")
+    parser.add_argument("--output", default="context_benchmark.json", help="Where to write JSON results")
+    args = parser.parse_args()
+
+    configure_before_import(SEARCH_BACKEND=args.backend)
+    from assistant import search_elasticsearch
+
+    ground_truth = load_ground_truth(args.ground_truth, limit=args.queries)
+    retrieved = {
+        mode: [(record, search_elasticsearch(record['question'], args.search_type, rerank=mode == "on")) for record in ground_truth]
+        for mode in args.rerank
+    }
+
+    results = []
+    for mode, budget in ((mode, budget) for mode in args.rerank for budget in args.budgets):
+        docs = tokens = recalled = 0
+        for record, search_results in retrieved[mode]:
+            if budget:
+                context, stats = assemble_context(search_results, args.model, budget=budget)
+            else:
+                context = "\n\n".join(format_entry(doc) for doc in search_results)
+                stats = {'context_docs': len(search_results), 'context_tokens': count_tokens(context, args.model)}
+            docs += stats['context_docs']
+            tokens += stats['context_tokens']
+            expected = next((doc for doc in search_results if doc.get('doc_id') == record['document']), None)
+            if expected is not None and expected.get('Question', '') in context:
+                recalled += 1
+        n = len(ground_truth) or 1
+        results.append({
+            'rerank': mode == "on",
+            'budget': budget,
+            'mean_context_docs': docs / n,
+            'mean_context_tokens': tokens / n,
+            'context_recall': recalled / n,
+        })
+
+    print(f"{'rerank':>6} {'budget':>7} {'docs':>6} {'tokens':>8} {'recall':>7}")
+    for r in results:
+        print(f"{'on' if r['rerank'] else 'off':>6} {r['budget'] or 'none':>7} {r['mean_context_docs']:>6.2f} {r['mean_context_tokens']:>8.1f} {r['context_recall']:>7.3f}")
+    write_json(args.output, {
+        'backend': args.backend, 'search_type': args.search_type, 'model': args.model,
+        'queries': len(ground_truth), 'results': results,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Compare encoder backends (PyTorch vs ONNX Runtime fp32/int8) on speed and retrieval quality.
+
+Example:
+    python benchmark_encoder.py --backends torch onnx onnx-int8 --queries 500
+"""
+import os
+import time
+import argparse
+import logging
+
+import numpy as np
+
+from benchmark_utils import GROUND_TRUTH_PATH, hit_rate, latency_summary, load_ground_truth, mrr, write_json
+from embedding_store import FIELD_TEXTS
+from encoders import ENCODER_BACKENDS, load_encoder
+from search_backend import DOCUMENTS_PATH, load_documents, normalize_rows
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = os.getenv("MODEL_NAME", "multi-qa-MiniLM-L6-cos-v1")
+
+
+def benchmark_backend(backend, documents, ground_truth, batch_size, top_k):
+    start_time = time.time()
+    encoder = load_encoder(MODEL_NAME, backend=backend)
+    load_time = time.time() - start_time
+
+    # Document throughput: batched encoding of the question+answer texts used for Vector search
+    texts = [FIELD_TEXTS["question_text_vector"](doc) for doc in documents]
+    encoder.encode(texts[:batch_size], batch_size=batch_size)  # Warm-up
+    start_time = time.time()
+    doc_vectors = normalize_rows(np.asarray(encoder.encode(texts, batch_size=batch_size), dtype=np.float32))
+    encode_time = time.time() - start_time
+
+    # Query latency: one query at a time, as in the live request path
+    latencies = []
+    query_vectors = []
+    for record in ground_truth:
+        start_time = time.time()
+        query_vectors.append(encoder.encode(record['question']))
+        latencies.append(time.time() - start_time)
+    query_vectors = normalize_rows(np.asarray(query_vectors, dtype=np.float32))
+
+    # Retrieval quality: cosine top-k over the corpus against the ground-truth document
+    doc_ids = np.array([doc['doc_id'] for doc in documents])
+    top = np.argsort(-(query_vectors @ doc_vectors.T), axis=1)[:, :top_k]
+    relevance_total = [
+        [doc_id == record['document'] for doc_id in doc_ids[row]] for record, row in zip(ground_truth, top)
+    ]
+
+    result = {
+        'backend': backend,
+        'load_time_s': load_time,
+        'docs_per_sec': len(texts) / encode_time if encode_time else 0.0,
+        'queries_per_sec': len(latencies) / sum(latencies) if latencies else 0.0,
+        'query_latency': latency_summary(latencies),
+        'hit_rate': hit_rate(relevance_total),
+        'mrr': mrr(relevance_total),
+    }
+    return result, doc_vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark encoder backends on latency, throughput and retrieval quality.")
+    parser.add_argument("--backends", nargs="+", choices=ENCODER_BACKENDS, default=ENCODER_BACKENDS)
+    parser.add_argument("--documents", default=DOCUMENTS_PATH, help="FAQ documents JSON")
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH, help="Ground-truth questions CSV")
+    parser.add_argument("--queries", type=int, default=None, help="Limit the number of ground-truth questions")
+    parser.add_argument("--batch-size", type=int, default=64, help="Batch size for document encoding")
+    parser.add_argument("--top-k", type=int, default=5, help="Results considered for hit rate and MRR")
+    parser.add_argument("--output", default="encoder_benchmark.json", help="Where to write JSON results")
+    args = parser.parse_args()
+
+    documents = load_documents(args.documents)
+    ground_truth = load_ground_truth(args.ground_truth, limit=args.queries)
+
+    results = []
+    reference_vectors = None
+    for backend in args.backends:
+        logger.info(f"Benchmarking {backend} backend...")
+        result, doc_vectors = benchmark_backend(backend, documents, ground_truth, args.batch_size, args.top_k)
+        if backend == "torch":
+            reference_vectors = doc_vectors
+        if reference_vectors is not None:
+            # Agreement of document embeddings with the PyTorch model
+            result['mean_cosine_vs_torch'] = float(np.mean(np.sum(doc_vectors * reference_vectors, axis=1)))
+        results.append(result)
+
+    print(f"{'backend':<10} {'load s':>7} {'docs/s':>8} {'q/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'hit rate':>9} {'MRR':>7}")
+    for r in results:
+        print(
+            f"{r['backend']:<10} {r['load_time_s']:>7.2f} {r['docs_per_sec']:>8.1f} {r['queries_per_sec']:>8.1f} "
+            f"{r['query_latency']['p50_ms']:>8.2f} {r['query_latency']['p95_ms']:>8.2f} "
+            f"{r['hit_rate']:>9.3f} {r['mrr']:>7.3f}"
+        )
+    write_json(args.output, {'model': MODEL_NAME, 'queries': len(ground_truth), 'results': results})
+
+
+if __name__ == "__main__":
+    main()
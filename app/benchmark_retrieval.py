@@ -0,0 +1,143 @@
+"""Replay ground_truth_data.csv through assistant.search_elasticsearch and report quality and latency.
+
+Examples:
+    python benchmark_retrieval.py --backend elasticsearch --concurrency 8
+    python benchmark_retrieval.py --backend memory --output retrieval.json --baseline retrieval_main.json
+    python benchmark_retrieval.py --backend memory --search-types Vector --rerank off on
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_utils import GROUND_TRUTH_PATH, configure_before_import, hit_rate, latency_summary, load_ground_truth, mrr, write_json
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+def run_search_type(search, ground_truth, search_type, concurrency, warmup):
+    """Run every ground-truth question through search(query, search_type) with a thread pool."""
+    for record in ground_truth[:warmup]:
+        search(record['question'], search_type)
+
+    def timed_search(record):
+        start_time = time.perf_counter()
+        try:
+            results = search(record['question'], search_type)
+            error = None
+        except Exception as e:
+            results, error = [], str(e)
+        latency = time.perf_counter() - start_time
+        return [doc.get('doc_id') == record['document'] for doc in results], latency, error
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(timed_search, ground_truth))
+    wall_time = time.perf_counter() - start_time
+
+    relevance_total = [relevance for relevance, _, _ in outcomes]
+    latencies = [latency for _, latency, _ in outcomes]
+    errors = [error for _, _, error in outcomes if error]
+    if errors:
+        logger.warning(f"{len(errors)} {search_type} queries failed, e.g. {errors[0]}")
+    return {
+        'search_type': search_type,
+        'concurrency': concurrency,
+        'queries': len(ground_truth),
+        'errors': len(errors),
+        'hit_rate': hit_rate(relevance_total),
+        'mrr': mrr(relevance_total),
+        'qps': len(ground_truth) / wall_time if wall_time else 0.0,
+        'latency': latency_summary(latencies),
+    }
+
+def run_key(r):
+    # Runs from before reranking existed were not reranked
+    return r['search_type'], r['concurrency'], r.get('rerank', False)
+
+def compare_to_baseline(results, baseline, max_quality_drop, max_latency_increase):
+    """Return a list of regressions of results against a previous run's JSON."""
+    previous = {run_key(r): r for r in baseline.get('results', [])}
+    regressions = []
+    for r in results:
+        before = previous.get(run_key(r))
+        if not before:
+            continue
+        for metric in ('hit_rate', 'mrr'):
+            if before[metric] - r[metric] > max_quality_drop:
+                regressions.append(f"{r['search_type']} {metric}: {before[metric]:.3f} -> {r[metric]:.3f}")
+        p95_before, p95_now = before['latency']['p95_ms'], r['latency']['p95_ms']
+        if p95_before and (p95_now - p95_before) / p95_before > max_latency_increase:
+            regressions.append(f"{r['search_type']} p95: {p95_before:.1f}ms -> {p95_now:.1f}ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark over the ground-truth questions.")
+    parser.add_argument("--backend", choices=["elasticsearch", "memory"], default=os.getenv("SEARCH_BACKEND", "elasticsearch"),
+                        help="Local Elasticsearch container or the in-process search backend")
+    parser.add_argument("--search-types", nargs="+", choices=["Text", "Vector"], default=["Text", "Vector"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1], help="One or more client concurrency levels")
+    parser.add_argument("--rerank", nargs="+", choices=["off", "on"], default=["off"],
+                        help="Run without and/or with the cross-encoder reranking stage")
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH, help="Ground-truth questions CSV")
+    parser.add_argument("--queries", type=int, default=None, help="Limit the number of ground-truth questions")
+    parser.add_argument("--warmup", type=int, default=10, help="Queries run before measuring")
+    parser.add_argument("--output", default="retrieval_benchmark.json", help="Where to write JSON results")
+    parser.add_argument("--baseline", help="Previous results JSON to check for regressions")
+    parser.add_argument("--max-quality-drop", type=float, default=0.01, help="Allowed absolute hit rate/MRR drop")
+    parser.add_argument("--max-latency-increase", type=float, default=0.2, help="Allowed relative p95 increase")
+    args = parser.parse_args()
+
+    configure_before_import(SEARCH_BACKEND=args.backend)
+    from assistant import search_elasticsearch
+    from reranker import reranker_stats
+
+    ground_truth = load_ground_truth(args.ground_truth, limit=args.queries)
+    results = []
+    for search_type in args.search_types:
+        for concurrency in args.concurrency:
+            for mode in args.rerank:
+                rerank = mode == "on"
+                logger.info(f"Running {search_type} search at concurrency {concurrency}, reranking {mode}...")
+                over_budget = reranker_stats()['over_budget']
+                result = run_search_type(
+                    lambda query, search_type: search_elasticsearch(query, search_type, rerank=rerank),
+                    ground_truth, search_type, concurrency, args.warmup,
+                )
+                result['rerank'] = rerank
+                if rerank:
+                    # Queries that kept the retrieval order because scoring missed RERANK_TIME_BUDGET_MS
+                    result['rerank_over_budget'] = reranker_stats()['over_budget'] - over_budget
+                results.append(result)
+
+    print(f"{'search':<7} {'conc':>4} {'rerank':>6} {'hit rate':>9} {'MRR':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'QPS':>8} {'errors':>6}")
+    for r in results:
+        print(
+            f"{r['search_type']:<7} {r['concurrency']:>4} {'on' if r['rerank'] else 'off':>6} {r['hit_rate']:>9.3f} {r['mrr']:>7.3f} "
+            f"{r['latency']['p50_ms']:>8.2f} {r['latency']['p95_ms']:>8.2f} {r['latency']['p99_ms']:>8.2f} "
+            f"{r['qps']:>8.1f} {r['errors']:>6}"
+        )
+    write_json(args.output, {'revision': git_revision(), 'backend': args.backend, 'results': results})
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.max_quality_drop, args.max_latency_increase)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import os
+import csv
+import sys
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data_prep")
+GROUND_TRUTH_PATH = os.getenv("GROUND_TRUTH_PATH", os.path.join(DATA_DIR, "ground_truth_data.csv"))
+
+
+# Modules that read their configuration from the environment when first imported
+CONFIGURED_AT_IMPORT = ("assistant", "db", "evaluator", "llm_clients", "reranker")
+
+def configure_before_import(**settings):
+    """Set environment variables for modules that read them at import time; call before importing them."""
+    loaded = [name for name in CONFIGURED_AT_IMPORT if name in sys.modules]
+    if loaded:
+        logger.warning(f"{', '.join(loaded)} already imported; {', '.join(settings)} may not take effect")
+    for name, value in settings.items():
+        os.environ[name] = str(value)
+
+def load_ground_truth(path=GROUND_TRUTH_PATH, limit=None):
+    """Ground-truth rows as dicts with 'question', 'category' and 'document' (the expected doc_id)."""
+    with open(path, newline='') as f:
+        records = [
+            {'question': row['Question'], 'category': row['Category'], 'document': row['Document']}
+            for row in csv.DictReader(f)
+        ]
+    if limit:
+        records = records[:limit]
+    logger.info(f"Loaded {len(records)} ground-truth questions from {path}")
+    return records
+
+def parse_mapping(value):
+    """Parse "openai=8,groq=4" into {'openai': 8, 'groq': 4}."""
+    return {
+        name.strip(): int(number)
+        for name, number in (item.split("=", 1) for item in value.split(",") if "=" in item)
+    }
+
+def hit_rate(relevance_total):
+    """Share of queries whose expected document appears in the results."""
+    cnt = 0
+    for line in relevance_total:
+        if True in line:
+            cnt = cnt + 1
+    return cnt / len(relevance_total) if relevance_total else 0.0
+
+def mrr(relevance_total):
+    """Mean reciprocal rank of the expected document."""
+    total_score = 0.0
+    for line in relevance_total:
+        for rank in range(len(line)):
+            if line[rank]:
+                total_score = total_score + 1 / (rank + 1)
+                break
+    return total_score / len(relevance_total) if relevance_total else 0.0
+
+def percentile(values, q):
+    """q-th percentile (0-100) with linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def latency_summary(latencies):
+    """p50/p95/p99/mean of latencies given in seconds, reported in milliseconds."""
+    return {
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': (sum(latencies) / len(latencies) * 1000) if latencies else 0.0,
+    }
+
+def pareto_front(rows, maximize=(), minimize=()):
+    """Rows not dominated by another row: at least as good on every metric and better on one."""
+    def key(row):
+        return [row[m] for m in maximize] + [-row[m] for m in minimize]
+
+    keys = [key(row) for row in rows]
+    front = []
+    for i, row in enumerate(rows):
+        dominated = any(
+            all(a >= b for a, b in zip(other, keys[i])) and other != keys[i]
+            for j, other in enumerate(keys) if j != i
+        )
+        if not dominated:
+            front.append(row)
+    return front
+
+def write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    logger.info(f"Results written to {path}")
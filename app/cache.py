@@ -0,0 +1,311 @@
+import re
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive form of a query used as a cache key."""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache with hit and miss counters.
+
+    The least recently used entries are evicted beyond `maxsize`; a maxsize
+    of 0 or less disables caching. Subclasses decide what the keys are.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        if self.maxsize <= 0:
+            return default
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        # Called with the lock held
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class EmbeddingCache(LRUCache):
+    """LRU cache of query embeddings keyed by model and normalized text.
+
+    A single instance is shared by every Streamlit session in the process.
+    Cached vectors are marked read-only so callers cannot mutate shared state.
+    """
+
+    def __init__(self, maxsize=1024):
+        super().__init__(maxsize)
+
+    def get_or_compute(self, text, model_name, encode):
+        key = (model_name, normalize_query(text))
+        vector = self.get(key)
+        if vector is not None:
+            return vector
+        # Encode outside the lock so concurrent misses do not serialize on the model
+        vector = encode(text)
+        if hasattr(vector, 'flags'):
+            vector.flags.writeable = False
+        self.put(key, vector)
+        return vector
+
+
+class ScoreCache(LRUCache):
+    """LRU cache of (query, document) relevance scores.
+
+    Keys are the model name, the normalized query and the document id, so a
+    popular question is scored against each candidate document only once.
+    """
+
+    def __init__(self, maxsize=10000):
+        super().__init__(maxsize)
+
+    def get_many(self, model_name, query, doc_ids):
+        """doc_id -> score for the documents already scored against query."""
+        query = normalize_query(query)
+        scores = {}
+        for doc_id in doc_ids:
+            score = self.get((model_name, query, doc_id))
+            if score is not None:
+                scores[doc_id] = score
+        return scores
+
+    def put_many(self, model_name, query, scores):
+        query = normalize_query(query)
+        for doc_id, score in scores.items():
+            self.put((model_name, query, doc_id), score)
+
+
+class SemanticAnswerCache(LRUCache):
+    """Cache of get_answer results matched by query-embedding similarity.
+
+    Entries are partitioned by (model_choice, search_type); a lookup returns
+    the most similar unexpired entry whose cosine similarity to the query is
+    at least `threshold`. The oldest-used entries are evicted beyond `maxsize`.
+    """
+
+    def __init__(self, maxsize=1000, threshold=0.95, ttl=3600):
+        super().__init__(maxsize)
+        self.threshold = threshold
+        self.ttl = ttl
+        self._next_key = 0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry['created'] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, vector, model_choice, search_type):
+        """Return (answer_data, similarity) for the best match, or None."""
+        if self.maxsize <= 0:
+            return None
+        query = self._normalize(vector)
+        with self._lock:
+            self._expire(time.time())
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry['partition'] == (model_choice, search_type)
+            ]
+            if candidates:
+                similarities = np.stack([entry['vector'] for _, entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(entry['answer_data']), float(similarities[best])
+            self.misses += 1
+            return None
+
+    def store(self, vector, model_choice, search_type, answer_data):
+        if self.maxsize <= 0:
+            return
+        entry = {
+            'vector': self._normalize(vector),
+            'partition': (model_choice, search_type),
+            'answer_data': dict(answer_data),
+            'created': time.time(),
+        }
+        with self._lock:
+            self._entries[self._next_key] = entry
+            self._next_key += 1
+            self._evict()
+
+    def update_relevance(self, answer, old_relevance, relevance, explanation):
+        """Replace old_relevance on the cached entries for `answer` (e.g. once it has been judged)."""
+        updated = 0
+        with self._lock:
+            for entry in self._entries.values():
+                answer_data = entry['answer_data']
+                if answer_data['answer'] == answer and answer_data['relevance'] == old_relevance:
+                    answer_data['relevance'] = relevance
+                    answer_data['relevance_explanation'] = explanation
+                    updated += 1
+        return updated
+
+
+class Flight:
+    """One in-flight computation shared by threads, with the text it has streamed so far."""
+
+    def __init__(self):
+        self.parts = []
+        self.result = None
+        self.error = None
+        self.done = False
+        self._condition = threading.Condition()
+
+    def publish(self, text):
+        with self._condition:
+            self.parts.append(text)
+            self._condition.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self._condition:
+            self.result, self.error, self.done = result, error, True
+            self._condition.notify_all()
+
+    def follow(self, on_part=None):
+        """Wait for the result, passing streamed text to on_part as it arrives; re-raises the leader's error."""
+        seen = 0
+        while True:
+            with self._condition:
+                while len(self.parts) == seen and not self.done:
+                    self._condition.wait()
+                new_parts = self.parts[seen:]
+                seen = len(self.parts)
+                done = self.done
+            if on_part:
+                for text in new_parts:
+                    on_part(text)
+            if done:
+                break
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class AsyncFlight:
+    """Flight for coroutines on one event loop; publish, finish and on_part are awaited."""
+
+    def __init__(self):
+        self.parts = []
+        self.result = None
+        self.error = None
+        self.done = False
+        self._condition = asyncio.Condition()
+
+    async def publish(self, text):
+        async with self._condition:
+            self.parts.append(text)
+            self._condition.notify_all()
+
+    async def finish(self, result=None, error=None):
+        async with self._condition:
+            self.result, self.error, self.done = result, error, True
+            self._condition.notify_all()
+
+    async def follow(self, on_part=None):
+        seen = 0
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: len(self.parts) > seen or self.done)
+                new_parts = self.parts[seen:]
+                seen = len(self.parts)
+                done = self.done
+            if on_part:
+                for text in new_parts:
+                    await on_part(text)
+            if done:
+                break
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Coalesces concurrent computations with the same key into one.
+
+    The first caller for a key becomes the leader and computes; callers that
+    join while it is in flight follow its Flight instead of computing again.
+    The key is released before the leader finishes, so later callers start
+    afresh rather than reusing a finished result.
+    """
+
+    def __init__(self, flight_class=Flight):
+        self.flight_class = flight_class
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def join(self, key):
+        """(flight, is_leader) for key, starting a new flight when none is in progress."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self.flight_class()
+            self._flights[key] = flight
+            self.leaders += 1
+            return flight, True
+
+    def release(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stats(self):
+        with self._lock:
+            requests = self.leaders + self.coalesced
+            return {
+                'in_flight': len(self._flights),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'coalesced_rate': self.coalesced / requests if requests else 0.0,
+            }
@@ -1,11 +1,15 @@
 import os
+import time
+import argparse
 import logging
-from sentence_transformers import SentenceTransformer
 from elasticsearch import Elasticsearch
+from elasticsearch.helpers import bulk, parallel_bulk, scan
 from tqdm.auto import tqdm
 from dotenv import load_dotenv
 
 from db import init_db
+from embedding_store import EmbeddingStore, compute_content_hash
+from encoders import encoder_id, load_encoder
 
 # Load environment variables
 load_dotenv()
@@ -16,7 +20,13 @@ logger = logging.getLogger(__name__)
 
 ELASTIC_URL = os.getenv("ELASTIC_URL_LOCAL", "http://localhost:9200")
 MODEL_NAME = os.getenv("MODEL_NAME", "multi-qa-MiniLM-L6-cos-v1")
-INDEX_NAME = "insights-questions"  # Updated index name
+ENCODER_ID = encoder_id(MODEL_NAME)  # Model name plus encoder backend, identifies the stored vectors
+INDEX_NAME = "insights-questions"  # Alias pointing at the live versioned index
+
+# Batched ingestion settings
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+BULK_THREAD_COUNT = int(os.getenv("BULK_THREAD_COUNT", "4"))
 
 import json
 import requests
@@ -40,12 +50,17 @@ def fetch_documents():
 
 
 def load_model():
-    logger.info(f"Loading model: {MODEL_NAME}")
-    return SentenceTransformer(MODEL_NAME)
+    logger.info(f"Loading model: {ENCODER_ID}")
+    return load_encoder(MODEL_NAME)
+
+def new_index_name():
+    return f"{INDEX_NAME}-{time.strftime('%Y%m%d%H%M%S')}"
 
-def setup_elasticsearch():
+def setup_elasticsearch(index_name=None):
+    """Create a fresh versioned index; the alias is only switched to it once it is fully built."""
     logger.info("Setting up Elasticsearch...")
     es_client = Elasticsearch(ELASTIC_URL)
+    index_name = index_name or new_index_name()
 
     index_settings = {
         "settings": {
@@ -53,11 +68,13 @@ def setup_elasticsearch():
             "number_of_replicas": 0
         },
         "mappings": {
+            "_meta": {"model_name": ENCODER_ID},
             "properties": {
                 "Answer": {"type": "text"},
                 "Category": {"type": "text"},
                 "Question": {"type": "text"},
                 "doc_id": {"type": "keyword"},
+                "content_hash": {"type": "keyword"},
                 "question_vector": {
                     "type": "dense_vector",
                     "dims": 384,
@@ -80,14 +97,82 @@ def setup_elasticsearch():
         }
     }
 
-    es_client.indices.delete(index=INDEX_NAME, ignore_unavailable=True)
-    es_client.indices.create(index=INDEX_NAME, body=index_settings)
-    logger.info(f"Elasticsearch index '{INDEX_NAME}' created")
-    return es_client
+    es_client.indices.create(index=index_name, body=index_settings)
+    logger.info(f"Elasticsearch index '{index_name}' created")
+    return es_client, index_name
+
+def get_alias_indices(es_client):
+    """Return the concrete indices currently behind INDEX_NAME (empty if it is not an alias)."""
+    if not es_client.indices.exists_alias(name=INDEX_NAME):
+        return []
+    return list(es_client.indices.get_alias(name=INDEX_NAME).keys())
+
+def switch_alias(es_client, index_name):
+    """Atomically point INDEX_NAME at index_name and drop the indices it replaces."""
+    old_indices = get_alias_indices(es_client)
+    actions = [{"add": {"index": index_name, "alias": INDEX_NAME}}]
+    actions += [{"remove": {"index": old, "alias": INDEX_NAME}} for old in old_indices]
+    if not old_indices and es_client.indices.exists(index=INDEX_NAME):
+        # Legacy deployments have a concrete index with the alias name; replace it in the same request
+        actions.append({"remove_index": {"index": INDEX_NAME}})
+    es_client.indices.update_aliases(actions=actions)
+    logger.info(f"Alias '{INDEX_NAME}' now points to '{index_name}'")
+
+    for old in old_indices:
+        if old != index_name:
+            es_client.indices.delete(index=old, ignore_unavailable=True)
+            logger.info(f"Deleted previous index '{old}'")
+
+def encode_documents(documents, model, batch_size=EMBEDDING_BATCH_SIZE, store=None):
+    """Attach question, answer and question+answer vectors, reusing stored embeddings."""
+    store = store or EmbeddingStore(ENCODER_ID)
+    vectors = store.get_embeddings(documents, model, batch_size=batch_size)
+    for field, array in vectors.items():
+        for doc, vector in zip(documents, array):
+            doc[field] = vector.tolist()
+    return documents
+
+def index_documents(es_client, documents, model, index_name=INDEX_NAME, chunk_size=BULK_CHUNK_SIZE,
+                    thread_count=BULK_THREAD_COUNT, batch_size=EMBEDDING_BATCH_SIZE, store=None):
+    """Encode documents in batches and send them with the bulk API."""
+    logger.info(
+        f"Indexing {len(documents)} documents into '{index_name}' "
+        f"(batch_size={batch_size}, chunk_size={chunk_size}, thread_count={thread_count})..."
+    )
+    if not documents:
+        return 0
+    start_time = time.time()
+    for doc in documents:
+        doc['content_hash'] = compute_content_hash(doc)
+    encode_documents(documents, model, batch_size=batch_size, store=store)
+    encode_time = time.time() - start_time
+
+    actions = ({"_index": index_name, "_id": doc['doc_id'], "_source": doc} for doc in documents)
+    indexed, failed = 0, 0
+    for ok, info in parallel_bulk(
+        es_client, actions, chunk_size=chunk_size, thread_count=thread_count, raise_on_error=False
+    ):
+        if ok:
+            indexed += 1
+        else:
+            failed += 1
+            logger.error(f"Failed to index document: {info}")
+    es_client.indices.refresh(index=index_name)
+
+    total_time = time.time() - start_time
+    logger.info(
+        f"Indexed {indexed} documents ({failed} failed) in {total_time:.2f}s "
+        f"(encode {encode_time:.2f}s, bulk {total_time - encode_time:.2f}s): "
+        f"{indexed / total_time:.1f} docs/sec"
+    )
+    return indexed
 
-def index_documents(es_client, documents, model):
-    logger.info("Indexing documents...")
+def index_documents_sequential(es_client, documents, model, index_name=INDEX_NAME):
+    """Original one-document-at-a-time loop, kept for throughput comparison."""
+    logger.info("Indexing documents sequentially...")
+    start_time = time.time()
     for doc in tqdm(documents):
+        doc['content_hash'] = compute_content_hash(doc)
         question = doc['Question']
         text = doc['Answer']
         qt = question + ' ' + text
@@ -95,10 +180,84 @@ def index_documents(es_client, documents, model):
         doc['question_vector'] = model.encode(question).tolist()
         doc['text_vector'] = model.encode(text).tolist()
         doc['question_text_vector'] = model.encode(qt).tolist()
-        es_client.index(index=INDEX_NAME, document=doc)
-    logger.info(f"Indexed {len(documents)} documents")
+        es_client.index(index=index_name, id=doc['doc_id'], document=doc)
+    es_client.indices.refresh(index=index_name)
+    total_time = time.time() - start_time
+    logger.info(
+        f"Indexed {len(documents)} documents in {total_time:.2f}s: {len(documents) / total_time:.1f} docs/sec"
+    )
+    return len(documents)
+
+def fetch_indexed_hashes(es_client):
+    """Map doc_id -> content_hash for every document behind the alias."""
+    hashes = {}
+    for hit in scan(es_client, index=INDEX_NAME, query={"query": {"match_all": {}}}, _source=["content_hash"]):
+        hashes[hit['_id']] = hit['_source'].get('content_hash')
+    return hashes
+
+def can_reindex_incrementally(es_client):
+    """Incremental updates need an aliased index built with the current model."""
+    indices = get_alias_indices(es_client)
+    if len(indices) != 1:
+        logger.info(f"'{INDEX_NAME}' is not an alias to a single index; a full rebuild is required")
+        return False
+    mapping = es_client.indices.get_mapping(index=indices[0])[indices[0]]['mappings']
+    indexed_model = mapping.get('_meta', {}).get('model_name')
+    if indexed_model != ENCODER_ID:
+        logger.info(f"Index was built with model '{indexed_model}', current model is '{ENCODER_ID}'; a full rebuild is required")
+        return False
+    return True
+
+def reindex_incremental(es_client, documents, model, **bulk_options):
+    """Embed and upsert only new or changed documents, and delete removed ones."""
+    start_time = time.time()
+    indexed_hashes = fetch_indexed_hashes(es_client)
+    changed = [doc for doc in documents if indexed_hashes.get(doc['doc_id']) != compute_content_hash(doc)]
+    current_ids = {doc['doc_id'] for doc in documents}
+    removed = [doc_id for doc_id in indexed_hashes if doc_id not in current_ids]
+    logger.info(
+        f"Incremental reindex: {len(changed)} new or changed, {len(removed)} removed, "
+        f"{len(documents) - len(changed)} unchanged"
+    )
+
+    index_documents(es_client, changed, model, index_name=INDEX_NAME, **bulk_options)
+    if removed:
+        actions = ({"_op_type": "delete", "_index": INDEX_NAME, "_id": doc_id} for doc_id in removed)
+        deleted, errors = bulk(es_client, actions, raise_on_error=False)
+        for error in errors:
+            logger.error(f"Failed to delete document: {error}")
+        es_client.indices.refresh(index=INDEX_NAME)
+        logger.info(f"Deleted {deleted} removed documents")
+    logger.info(f"Incremental reindex finished in {time.time() - start_time:.2f}s")
+
+def rebuild_index(documents, model, sequential=False, **bulk_options):
+    """Build a fresh versioned index and switch the alias once it is complete."""
+    es_client, index_name = setup_elasticsearch()
+    try:
+        if sequential:
+            index_documents_sequential(es_client, documents, model, index_name=index_name)
+        else:
+            index_documents(es_client, documents, model, index_name=index_name, **bulk_options)
+    except Exception:
+        # Leave the live alias untouched and clean up the half-built index
+        es_client.indices.delete(index=index_name, ignore_unavailable=True)
+        raise
+    switch_alias(es_client, index_name)
+    return es_client
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Index FAQ documents into Elasticsearch and initialize the database.")
+    parser.add_argument("--mode", choices=["incremental", "full"], default="incremental",
+                        help="Update changed documents in place, or rebuild a new index and swap the alias")
+    parser.add_argument("--sequential", action="store_true",
+                        help="Use the per-document indexing loop instead of batched bulk ingestion (full mode)")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="Embedding batch size")
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE, help="Documents per bulk request")
+    parser.add_argument("--thread-count", type=int, default=BULK_THREAD_COUNT, help="Parallel bulk request threads")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
     logger.info("Starting the indexing process...")
 
     documents = fetch_documents()
@@ -107,8 +266,24 @@ def main():
         return
 
     model = load_model()
-    es_client = setup_elasticsearch()
-    index_documents(es_client, documents, model)
+    for doc in documents:
+        doc['content_hash'] = compute_content_hash(doc)
+
+    # Bring the on-disk embedding store in line with the corpus; only new or changed documents are encoded
+    store = EmbeddingStore(ENCODER_ID)
+    store.get_embeddings(documents, model, batch_size=args.batch_size, prune=True)
+
+    bulk_options = {
+        "chunk_size": args.chunk_size,
+        "thread_count": args.thread_count,
+        "batch_size": args.batch_size,
+        "store": store,
+    }
+    es_client = Elasticsearch(ELASTIC_URL)
+    if args.mode == "incremental" and can_reindex_incrementally(es_client):
+        reindex_incremental(es_client, documents, model, **bulk_options)
+    else:
+        rebuild_index(documents, model, sequential=args.sequential, **bulk_options)
 
     logger.info("Initializing database...")
     init_db()
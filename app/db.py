@@ -1,11 +1,20 @@
 import os
+import time
+import queue
+import atexit
 import logging
+import threading
+from collections import deque
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
 from dotenv import load_dotenv
 from psycopg2 import pool
-from psycopg2.extras import DictCursor
+from psycopg2.extras import DictCursor, execute_values
+
+from benchmark_utils import percentile
+from migrations import apply_migrations
+from resources import lazy_resource
 
 # Load environment variables
 load_dotenv()
@@ -16,132 +25,364 @@ logger = logging.getLogger(__name__)
 # Timezone
 tz = ZoneInfo("Europe/Berlin")
 
-# Database connection pool
-db_pool = pool.SimpleConnectionPool(
+# Writes: "async" queues rows for a background writer that batches them, "sync" writes on the caller's thread
+DB_WRITE_MODE = os.getenv("DB_WRITE_MODE", "async")
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "100"))
+DB_WRITE_FLUSH_INTERVAL = float(os.getenv("DB_WRITE_FLUSH_INTERVAL", "1.0"))
+DB_WRITE_QUEUE_SIZE = int(os.getenv("DB_WRITE_QUEUE_SIZE", "10000"))
+
+# Thread-safe database connection pool, opened on first use
+db_pool = lazy_resource("postgres", lambda: pool.ThreadedConnectionPool(
     1, 20,
     host=os.getenv("POSTGRES_HOST", "postgres"),
     database=os.getenv("POSTGRES_DB", "research_assistant"),
     user=os.getenv("POSTGRES_USER", "your_username"),
     password=os.getenv("POSTGRES_PASSWORD", "your_password"),
-)
+))
 
 def get_db_connection():
-    return db_pool.getconn()
+    return db_pool.get().getconn()
 
 def release_db_connection(conn):
-    db_pool.putconn(conn)
+    db_pool.get().putconn(conn)
 
 def init_db():
+    """Bring the schema up to date by applying pending migrations; existing data is kept."""
     conn = get_db_connection()
     try:
-        with conn.cursor() as cur:
-            cur.execute("DROP TABLE IF EXISTS feedback")
-            cur.execute("DROP TABLE IF EXISTS conversations")
-            cur.execute("""
-                CREATE TABLE conversations (
-                    id TEXT PRIMARY KEY,
-                    question TEXT NOT NULL,
-                    answer TEXT NOT NULL,
-                    model_used TEXT NOT NULL,
-                    response_time FLOAT NOT NULL,
-                    relevance TEXT NOT NULL,
-                    relevance_explanation TEXT NOT NULL,
-                    prompt_tokens INTEGER NOT NULL,
-                    completion_tokens INTEGER NOT NULL,
-                    total_tokens INTEGER NOT NULL,
-                    eval_prompt_tokens INTEGER NOT NULL,
-                    eval_completion_tokens INTEGER NOT NULL,
-                    eval_total_tokens INTEGER NOT NULL,
-                    openai_cost FLOAT NOT NULL,
-                    timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            cur.execute("""
-                CREATE TABLE feedback (
-                    id SERIAL PRIMARY KEY,
-                    conversation_id TEXT REFERENCES conversations(id),
-                    feedback INTEGER NOT NULL,
-                    timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-        conn.commit()
+        applied = apply_migrations(conn)
+        if applied:
+            logger.info(f"Applied migrations {applied}")
     except Exception as e:
+        conn.rollback()
         logger.error(f"Error initializing database: {e}")
     finally:
         release_db_connection(conn)
 
-def save_conversation(conversation_id, question, answer_data, timestamp=None):
-    if timestamp is None:
-        timestamp = datetime.now(tz)
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
+# Queued row kind -> write_rows argument
+WRITE_KINDS = {"conversation": "conversations", "relevance": "relevance_updates", "feedback": "feedback"}
+
+CONVERSATION_COLUMNS = (
+    "id, question, answer, model_used, response_time, first_token_time, relevance, "
+    "relevance_explanation, prompt_tokens, completion_tokens, total_tokens, "
+    "eval_prompt_tokens, eval_completion_tokens, eval_total_tokens, openai_cost, cache_hit, "
+    "context_docs, context_tokens, coalesced, degradations, timestamp"
+)
+
+def row_conversation_id(kind, row):
+    # Conversation rows are queued with their stage timings
+    return row[0][0] if kind == "conversation" else row[0]
+
+def write_batch(conn, conversations=(), relevance_updates=(), feedback=()):
+    """Write queued rows with one multi-row statement per table in a single transaction.
+
+    Conversations go first so relevance updates and feedback in the same batch
+    can refer to them. Feedback for unknown conversations is skipped by the
+    join instead of a separate existence check.
+    """
+    with conn.cursor() as cur:
+        if conversations:
+            insert_start = time.perf_counter()
+            execute_values(
+                cur,
+                f"INSERT INTO conversations ({CONVERSATION_COLUMNS}) VALUES %s",
+                [row for row, _ in conversations],
+                page_size=len(conversations),
+            )
+            # The insert cost is shared by every row in the batch
+            insert_ms = (time.perf_counter() - insert_start) * 1000 / len(conversations)
+            timings = []
+            for row, stage_timings in conversations:
+                conversation_id, timestamp = row[0], row[-1]
+                for stage, duration_ms in {**stage_timings, "db_insert": insert_ms}.items():
+                    timings.append((conversation_id, stage, duration_ms, timestamp))
+            execute_values(
+                cur,
+                "INSERT INTO stage_timings (conversation_id, stage, duration_ms, timestamp) VALUES %s",
+                timings,
+                page_size=len(timings),
+            )
+        if relevance_updates:
+            execute_values(
+                cur,
                 """
-                INSERT INTO conversations 
-                (id, question, answer, model_used, response_time, relevance, 
-                relevance_explanation, prompt_tokens, completion_tokens, total_tokens, 
-                eval_prompt_tokens, eval_completion_tokens, eval_total_tokens, openai_cost, timestamp)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-                (
-                    conversation_id,
-                    question,
-                    answer_data["answer"],
-                    answer_data["model_used"],
-                    answer_data["response_time"],
-                    answer_data["relevance"],
-                    answer_data["relevance_explanation"],
-                    answer_data["prompt_tokens"],
-                    answer_data["completion_tokens"],
-                    answer_data["total_tokens"],
-                    answer_data["eval_prompt_tokens"],
-                    answer_data["eval_completion_tokens"],
-                    answer_data["eval_total_tokens"],
-                    answer_data["openai_cost"],
-                    timestamp,
-                ),
+                UPDATE conversations AS c
+                SET relevance = v.relevance, relevance_explanation = v.explanation,
+                    eval_prompt_tokens = v.eval_prompt_tokens,
+                    eval_completion_tokens = v.eval_completion_tokens,
+                    eval_total_tokens = v.eval_total_tokens
+                FROM (VALUES %s) AS v(id, relevance, explanation,
+                                      eval_prompt_tokens, eval_completion_tokens, eval_total_tokens)
+                WHERE c.id = v.id AND c.relevance = 'PENDING'
+                """,
+                list(relevance_updates),
+                page_size=len(relevance_updates),
             )
-        conn.commit()
-    except Exception as e:
-        logger.error(f"Error saving conversation: {e}")
+        if feedback:
+            execute_values(
+                cur,
+                """
+                INSERT INTO feedback (conversation_id, feedback, timestamp)
+                SELECT v.conversation_id, v.feedback, v.timestamp
+                FROM (VALUES %s) AS v(conversation_id, feedback, timestamp)
+                JOIN conversations c ON c.id = v.conversation_id
+                """,
+                list(feedback),
+                page_size=len(feedback),
+            )
+            if cur.rowcount < len(feedback):
+                logger.error(f"{len(feedback) - cur.rowcount} feedback rows referenced unknown conversations and were not saved")
+    conn.commit()
+
+def write_rows(conversations=(), relevance_updates=(), feedback=()):
+    conn = get_db_connection()
+    try:
+        write_batch(conn, conversations, relevance_updates, feedback)
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         release_db_connection(conn)
 
-def save_feedback(conversation_id, feedback, timestamp=None):
+
+class DbWriter:
+    """Background writer that batches conversation, relevance and feedback rows.
+
+    Rows are flushed when DB_WRITE_BATCH_SIZE rows are queued or
+    DB_WRITE_FLUSH_INTERVAL seconds after the first queued row, whichever
+    comes first. One thread writes the rows in the order they were queued;
+    a full queue makes submitters wait. The queue is drained at interpreter exit.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_size=DB_WRITE_BATCH_SIZE, flush_interval=DB_WRITE_FLUSH_INTERVAL,
+                 queue_size=DB_WRITE_QUEUE_SIZE, max_retries=3):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.rows = queue.Queue(maxsize=queue_size)
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.blocked = 0
+        # Time spent in database writes, e.g. for attributing load-test latency to Postgres
+        self.write_ms = 0.0
+        self.write_latencies = deque(maxlen=1000)
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, kind, row):
+        """Queue a row, waiting for space when the queue is full.
+
+        Rows are never written around the queue, so they reach the database in
+        submission order: a relevance update or feedback row is never written
+        before the conversation it refers to.
+        """
+        try:
+            self.rows.put((kind, row), timeout=5)
+        except queue.Full:
+            with self._lock:
+                self.blocked += 1
+            logger.warning("Database write queue full; waiting for the writer to catch up")
+            self.rows.put((kind, row))
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = None
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else max(0, deadline - time.monotonic())
+                try:
+                    item = self.rows.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    self.rows.task_done()
+                    stop = True
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch:
+                self._write(batch)
+                for _ in batch:
+                    self.rows.task_done()
+            if stop:
+                return
+
+    def _write(self, batch):
+        """Write a batch; if it keeps failing, write it by kind and then by row so one bad row cannot sink the rest."""
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self._write_rows(batch)
+                return
+            except Exception as e:
+                logger.error(f"Error writing batch of {len(batch)} rows (attempt {attempt}/{self.max_retries}): {e}")
+                time.sleep(min(2 ** attempt * 0.1, 2))
+        # Kinds in write order, so conversations exist before their relevance updates and feedback
+        for kind in WRITE_KINDS:
+            rows = [item for item in batch if item[0] == kind]
+            if not rows:
+                continue
+            if len(rows) > 1:
+                try:
+                    self._write_rows(rows)
+                    continue
+                except Exception as e:
+                    logger.error(f"Error writing {len(rows)} {kind} rows; writing them one by one: {e}")
+            for item in rows:
+                try:
+                    self._write_rows([item])
+                except Exception as e:
+                    with self._lock:
+                        self.failed += 1
+                    logger.error(f"Dropped {kind} row for conversation {row_conversation_id(*item)}: {e}")
+
+    def _write_rows(self, batch):
+        grouped = {argument: [] for argument in WRITE_KINDS.values()}
+        for kind, row in batch:
+            grouped[WRITE_KINDS[kind]].append(row)
+        start_time = time.perf_counter()
+        write_rows(**grouped)
+        write_ms = (time.perf_counter() - start_time) * 1000
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+            self.write_ms += write_ms
+            self.write_latencies.append(write_ms)
+
+    def flush(self):
+        """Block until every queued row has been written."""
+        self.rows.join()
+
+    def stop(self, timeout=10):
+        try:
+            self.rows.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            logger.error(f"Database write queue still full at exit; {self.rows.qsize()} queued rows were not written")
+            return
+        self.thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self.write_latencies)
+            return {
+                'queued': self.rows.qsize(),
+                'written': self.written,
+                'failed': self.failed,
+                'batches': self.batches,
+                'blocked': self.blocked,
+                'write_ms': self.write_ms,
+                'batch_p50_ms': percentile(latencies, 50),
+                'batch_p95_ms': percentile(latencies, 95),
+            }
+
+
+def create_db_writer():
+    writer = DbWriter()
+    atexit.register(writer.stop)
+    return writer
+
+db_writer = lazy_resource("db_writer", create_db_writer)
+
+def submit_write(kind, row):
+    if DB_WRITE_MODE == "async":
+        db_writer.get().submit(kind, row)
+        return
+    try:
+        write_rows(**{WRITE_KINDS[kind]: [row]})
+    except Exception as e:
+        logger.error(f"Error saving {kind}: {e}")
+
+def save_conversation(conversation_id, question, answer_data, timestamp=None):
     if timestamp is None:
         timestamp = datetime.now(tz)
+    row = (
+        conversation_id,
+        question,
+        answer_data["answer"],
+        answer_data["model_used"],
+        answer_data["response_time"],
+        answer_data.get("first_token_time"),
+        answer_data["relevance"],
+        answer_data["relevance_explanation"],
+        answer_data["prompt_tokens"],
+        answer_data["completion_tokens"],
+        answer_data["total_tokens"],
+        answer_data["eval_prompt_tokens"],
+        answer_data["eval_completion_tokens"],
+        answer_data["eval_total_tokens"],
+        answer_data["openai_cost"],
+        answer_data.get("cache_hit", False),
+        answer_data.get("context_docs"),
+        answer_data.get("context_tokens"),
+        answer_data.get("coalesced", False),
+        list(answer_data.get("degradations") or []),
+        timestamp,
+    )
+    submit_write("conversation", (row, dict(answer_data.get("stage_timings") or {})))
+
+def update_conversation_relevance(conversation_id, relevance, explanation, eval_tokens):
+    """Fill in the judge result for a conversation saved with PENDING relevance."""
+    submit_write("relevance", (
+        conversation_id,
+        relevance,
+        explanation,
+        eval_tokens.get("prompt_tokens", 0),
+        eval_tokens.get("completion_tokens", 0),
+        eval_tokens.get("total_tokens", 0),
+    ))
+
+def claim_pending_conversations(limit=1000, min_age=600):
+    """Claim PENDING rows nobody has saved or claimed for min_age seconds, for judging.
+
+    Newer rows are still with the process that saved (or last claimed) them.
+    SKIP LOCKED keeps processes starting together from claiming the same rows.
+    """
     conn = get_db_connection()
     try:
-        logger.info(f"Checking if conversation {conversation_id} exists before saving feedback.")
-        with conn.cursor() as cur:
+        with conn.cursor(cursor_factory=DictCursor) as cur:
             cur.execute(
                 """
-                SELECT EXISTS (
-                    SELECT 1 
-                    FROM conversations 
-                    WHERE id = %s
+                UPDATE conversations
+                SET evaluation_claimed_at = CURRENT_TIMESTAMP
+                WHERE id IN (
+                    SELECT id
+                    FROM conversations
+                    WHERE relevance = 'PENDING'
+                      AND COALESCE(evaluation_claimed_at, timestamp) < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                    ORDER BY timestamp
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
                 )
-                """, (conversation_id,)
+                RETURNING id, question, answer
+                """,
+                (min_age, limit),
             )
-            exists = cur.fetchone()[0]
-            if exists:
-                cur.execute(
-                    """
-                    INSERT INTO feedback (conversation_id, feedback, timestamp)
-                    VALUES (%s, %s, %s)
-                    """,
-                    (conversation_id, feedback, timestamp),
-                )
-                conn.commit()
-                logger.info(f"Feedback saved successfully for conversation {conversation_id}")
-            else:
-                logger.error(f"Conversation ID {conversation_id} does not exist. Feedback not saved.")
+            rows = cur.fetchall()
+        conn.commit()
+        return rows
     except Exception as e:
-        logger.error(f"Error saving feedback: {e}")
+        conn.rollback()
+        logger.error(f"Error claiming pending conversations: {e}")
+        return []
     finally:
         release_db_connection(conn)
 
+def save_feedback(conversation_id, feedback, timestamp=None):
+    if timestamp is None:
+        timestamp = datetime.now(tz)
+    submit_write("feedback", (conversation_id, feedback, timestamp))
+    logger.info(f"Feedback queued for conversation {conversation_id}")
+
+def flush_writes():
+    """Wait for queued writes, e.g. before reading back rows that were just saved."""
+    if DB_WRITE_MODE == "async" and db_writer.initialized:
+        db_writer.get().flush()
+
 def get_recent_conversations(limit=5, relevance=None):
     conn = get_db_connection()
     try:
@@ -170,10 +411,10 @@ def get_feedback_stats():
     try:
         with conn.cursor(cursor_factory=DictCursor) as cur:
             cur.execute("""
-                SELECT 
-                    SUM(CASE WHEN feedback > 0 THEN 1 ELSE 0 END) as thumbs_up,
-                    SUM(CASE WHEN feedback < 0 THEN 1 ELSE 0 END) as thumbs_down
-                FROM feedback
+                SELECT
+                    SUM(thumbs_up) as thumbs_up,
+                    SUM(thumbs_down) as thumbs_down
+                FROM feedback_rollups
             """)
             result = cur.fetchone()
             return {
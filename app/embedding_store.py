@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import uuid
+import fcntl
+import shutil
+import hashlib
+import logging
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_STORE_DIR = os.getenv(
+    "EMBEDDING_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "embeddings")
+)
+STORE_FORMAT_VERSION = 1
+# Version directories kept besides the current one, for processes still loading or mapping them
+EMBEDDING_STORE_KEEP_VERSIONS = int(os.getenv("EMBEDDING_STORE_KEEP_VERSIONS", "1"))
+
+VERSION_DIR_PATTERN = re.compile(r"^v(\d+)(?:-[0-9a-f]+)?$")
+
+# Text each embedding field is computed from
+FIELD_TEXTS = {
+    "question_vector": lambda doc: doc['Question'],
+    "text_vector": lambda doc: doc['Answer'],
+    "question_text_vector": lambda doc: doc['Question'] + ' ' + doc['Answer'],
+}
+
+
+def compute_content_hash(doc):
+    """Hash of the fields that feed the embeddings and the keyword index."""
+    content = "\x1f".join(doc.get(field, '') for field in ('Category', 'Question', 'Answer'))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def encode_fields(documents, model, batch_size=64):
+    """Compute every embedding field for documents in one batched model pass."""
+    texts = []
+    for text_of in FIELD_TEXTS.values():
+        texts.extend(text_of(doc) for doc in documents)
+    vectors = np.asarray(
+        model.encode(texts, batch_size=batch_size, show_progress_bar=len(texts) > batch_size),
+        dtype=np.float32,
+    )
+    n = len(documents)
+    return {field: vectors[i * n:(i + 1) * n] for i, field in enumerate(FIELD_TEXTS)}
+
+
+class EmbeddingStore:
+    """On-disk document embeddings keyed by doc_id, content hash and model name.
+
+    Each model gets its own directory holding a manifest and one .npy file per
+    embedding field. Every write goes to a new, uniquely named version
+    directory and the manifest is swapped atomically, so readers never see a
+    partial store. Writers (e.g. data_prep and a serving process) take a file
+    lock, so they neither pick the same version nor lose each other's entries.
+    Arrays are opened memory-mapped.
+    """
+
+    def __init__(self, model_name, root=EMBEDDING_STORE_DIR):
+        self.model_name = model_name
+        self.model_dir = os.path.join(root, model_name.replace('/', '__'))
+        self.manifest_path = os.path.join(self.model_dir, "manifest.json")
+        self.lock_path = os.path.join(self.model_dir, ".lock")
+        self.version = 0
+        self.doc_ids = []
+        self.hashes = []
+        self.rows = {}
+        self.arrays = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.manifest_path):
+            return self
+        with open(self.manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != STORE_FORMAT_VERSION or manifest.get('model_name') != self.model_name:
+            logger.warning(f"Ignoring incompatible embedding store at {self.model_dir}")
+            return self
+        # Stores written before version directories had unique names use v<version>
+        version_dir = os.path.join(self.model_dir, manifest.get('directory', f"v{manifest['version']}"))
+        self.arrays = {
+            field: np.load(os.path.join(version_dir, f"{field}.npy"), mmap_mode='r') for field in FIELD_TEXTS
+        }
+        self.version = manifest['version']
+        self.doc_ids = manifest['doc_ids']
+        self.hashes = manifest['content_hashes']
+        self.rows = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        logger.info(f"Loaded {len(self.doc_ids)} stored embeddings for {self.model_name} (v{self.version})")
+        return self
+
+    def _row(self, doc):
+        """Stored row for doc, or None if it is missing or its content changed."""
+        row = self.rows.get(doc['doc_id'])
+        if row is not None and self.hashes[row] == (doc.get('content_hash') or compute_content_hash(doc)):
+            return row
+        return None
+
+    def get_embeddings(self, documents, model, batch_size=64, prune=False):
+        """Return {field: array aligned with documents}, encoding only missing or changed entries.
+
+        When documents match the stored order exactly, the memory-mapped arrays
+        are returned as views without copying. With prune=True, entries for
+        documents not in `documents` are dropped from the store.
+        """
+        stored_rows = [self._row(doc) for doc in documents]
+        missing = [doc for doc, row in zip(documents, stored_rows) if row is None]
+        if not missing and stored_rows == list(range(len(documents))) and (not prune or len(self.doc_ids) == len(documents)):
+            return {field: array[:len(documents)] for field, array in self.arrays.items()}
+
+        logger.info(f"Embedding store: {len(documents) - len(missing)} cached, {len(missing)} to encode")
+        encoded = encode_fields(missing, model, batch_size=batch_size) if missing else {}
+        result = {}
+        for field in FIELD_TEXTS:
+            parts = []
+            next_new = 0
+            for row in stored_rows:
+                if row is None:
+                    parts.append(encoded[field][next_new])
+                    next_new += 1
+                else:
+                    parts.append(self.arrays[field][row])
+            result[field] = np.stack(parts) if parts else np.empty((0, 0), dtype=np.float32)
+
+        if missing or prune:
+            self._write(documents, result, keep_others=not prune)
+        return result
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive lock across processes writing this model's store."""
+        os.makedirs(self.model_dir, exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, documents, arrays, keep_others=True):
+        with self._locked():
+            # Start from the latest store, which another process may have written since we loaded
+            self.load()
+            doc_ids = [doc['doc_id'] for doc in documents]
+            hashes = [doc.get('content_hash') or compute_content_hash(doc) for doc in documents]
+            if keep_others:
+                # Retain entries for documents outside this call, after the given ones
+                current = set(doc_ids)
+                others = [row for row, doc_id in enumerate(self.doc_ids) if doc_id not in current]
+                if others:
+                    doc_ids += [self.doc_ids[row] for row in others]
+                    hashes += [self.hashes[row] for row in others]
+                    arrays = {field: np.concatenate([arrays[field], self.arrays[field][others]]) for field in arrays}
+
+            version = self.version + 1
+            directory = f"v{version}-{uuid.uuid4().hex[:8]}"
+            version_dir = os.path.join(self.model_dir, directory)
+            os.makedirs(version_dir)
+            for field, array in arrays.items():
+                np.save(os.path.join(version_dir, f"{field}.npy"), np.ascontiguousarray(array, dtype=np.float32))
+
+            manifest = {
+                "format_version": STORE_FORMAT_VERSION,
+                "model_name": self.model_name,
+                "version": version,
+                "directory": directory,
+                "doc_ids": doc_ids,
+                "content_hashes": hashes,
+            }
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, self.manifest_path)
+            logger.info(f"Wrote {len(doc_ids)} embeddings to {version_dir}")
+
+            self.load()
+            self._prune_versions()
+
+    def _prune_versions(self, keep=EMBEDDING_STORE_KEEP_VERSIONS):
+        """Delete version directories older than the current one and the `keep` before it."""
+        versions = []
+        for name in os.listdir(self.model_dir):
+            match = VERSION_DIR_PATTERN.match(name)
+            if match and os.path.isdir(os.path.join(self.model_dir, name)):
+                versions.append((int(match.group(1)), name))
+        versions.sort(reverse=True)
+        # Open memory maps keep working after their files are unlinked
+        for _, name in versions[keep + 1:]:
+            shutil.rmtree(os.path.join(self.model_dir, name), ignore_errors=True)
@@ -0,0 +1,122 @@
+import os
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Encoder backend: "torch" (SentenceTransformer), "onnx" or "onnx-int8" (ONNX Runtime, dynamically quantized)
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")
+ENCODER_BACKENDS = ["torch", "onnx", "onnx-int8"]
+ONNX_MODEL_DIR = os.getenv(
+    "ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models")
+)
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 lets ONNX Runtime decide
+
+
+def encoder_id(model_name, backend=ENCODER_BACKEND):
+    """Identifier for the vectors an encoder produces; non-torch backends get their own suffix."""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+def load_encoder(model_name, backend=ENCODER_BACKEND):
+    """Return an object with a SentenceTransformer-compatible encode() for the chosen backend."""
+    logger.info(f"Loading {backend} encoder for {model_name}")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer  # Imports torch; only needed for this backend
+        return SentenceTransformer(model_name)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEncoder(model_name, quantize=backend == "onnx-int8")
+    raise ValueError(f"Unknown encoder backend: {backend}")
+
+
+def export_onnx(model_name, model_dir=ONNX_MODEL_DIR, quantize=False):
+    """Export the transformer to ONNX once (optionally int8-quantized) and return (export_dir, model_path)."""
+    export_dir = os.path.join(model_dir, model_name.replace('/', '__'))
+    fp32_path = os.path.join(export_dir, "model.onnx")
+    int8_path = os.path.join(export_dir, "model.int8.onnx")
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        hub_name = model_name if '/' in model_name else f"sentence-transformers/{model_name}"
+        logger.info(f"Exporting {hub_name} to ONNX in {export_dir}")
+        tokenizer = AutoTokenizer.from_pretrained(hub_name)
+        transformer = AutoModel.from_pretrained(hub_name).eval()
+
+        class TokenEmbeddings(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.model(
+                    input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+                )[0]
+
+        os.makedirs(export_dir, exist_ok=True)
+        dummy = tokenizer(["export"], return_tensors="pt")
+        dynamic_axes = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                TokenEmbeddings(transformer),
+                (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+                fp32_path,
+                input_names=["input_ids", "attention_mask", "token_type_ids"],
+                output_names=["token_embeddings"],
+                dynamic_axes={
+                    "input_ids": dynamic_axes,
+                    "attention_mask": dynamic_axes,
+                    "token_type_ids": dynamic_axes,
+                    "token_embeddings": dynamic_axes,
+                },
+                opset_version=14,
+            )
+        tokenizer.save_pretrained(export_dir)
+
+    if not quantize:
+        return export_dir, fp32_path
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info(f"Quantizing {fp32_path} to int8")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return export_dir, int8_path
+
+
+class OnnxEncoder:
+    """Sentence embeddings from an ONNX Runtime session: mean pooling plus L2 normalization,
+    matching the multi-qa-MiniLM-L6-cos-v1 SentenceTransformer pipeline."""
+
+    def __init__(self, model_name, quantize=False, model_dir=ONNX_MODEL_DIR, max_seq_length=512):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        export_dir, model_path = export_onnx(model_name, model_dir=model_dir, quantize=quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        options = ort.SessionOptions()
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.max_seq_length = max_seq_length
+
+    def _encode_batch(self, texts):
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+        )
+        inputs = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        token_embeddings = self.session.run(None, inputs)[0]
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        batches = [self._encode_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        embeddings = np.concatenate(batches).astype(np.float32)
+        return embeddings[0] if single else embeddings
@@ -0,0 +1,169 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+from assistant import record_judged_relevance
+from judge import JUDGE_BATCH_SIZE, evaluate_relevance_batch
+from db import claim_pending_conversations, update_conversation_relevance
+
+logger = logging.getLogger(__name__)
+
+EVALUATION_WORKERS = int(os.getenv("EVALUATION_WORKERS", "2"))
+EVALUATION_QUEUE_SIZE = int(os.getenv("EVALUATION_QUEUE_SIZE", "1000"))
+# How long a worker waits for more queued answers to fill a judge batch
+EVALUATION_BATCH_WAIT = float(os.getenv("EVALUATION_BATCH_WAIT", "0.5"))
+# Judge attempts per answer before it is saved as UNKNOWN; retries back off exponentially
+EVALUATION_MAX_ATTEMPTS = int(os.getenv("EVALUATION_MAX_ATTEMPTS", "3"))
+# Seconds a PENDING row must go unsaved and unclaimed before another process recovers it
+EVALUATION_RECOVERY_AGE = float(os.getenv("EVALUATION_RECOVERY_AGE", "600"))
+
+
+class RelevanceEvaluator:
+    """Background pool that runs the LLM judge and fills in PENDING conversation rows.
+
+    The queue is bounded: when it is full, new jobs are dropped and their rows
+    stay PENDING until recovery, which runs every recovery_age / 2 seconds,
+    claims them. Workers judge up to batch_size queued answers per request. A failed request is retried
+    with backoff; after max_attempts its answers are saved as UNKNOWN.
+    """
+
+    def __init__(self, workers=EVALUATION_WORKERS, queue_size=EVALUATION_QUEUE_SIZE,
+                 batch_size=JUDGE_BATCH_SIZE, batch_wait=EVALUATION_BATCH_WAIT,
+                 max_attempts=EVALUATION_MAX_ATTEMPTS, recovery_age=EVALUATION_RECOVERY_AGE):
+        self.workers = workers
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.max_attempts = max(1, max_attempts)
+        self.recovery_age = recovery_age
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.threads = []
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retried = 0
+        self.eval_tokens = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"relevance-evaluator-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Started {self.workers} relevance evaluation workers")
+        self.recover_pending()
+        thread = threading.Thread(target=self._recover_periodically, name="relevance-recovery", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def recover_pending(self):
+        """Queue PENDING rows nobody is judging (left by a stopped process, or dropped from a full queue).
+
+        Only as many rows are claimed as the queue has free slots, and claimed
+        rows wait for a slot rather than being dropped, so a claim never strands a row.
+        """
+        free = self.jobs.maxsize - self.jobs.qsize()
+        if free <= 0:
+            return 0
+        pending = claim_pending_conversations(limit=free, min_age=self.recovery_age)
+        for row in pending:
+            self.jobs.put((row['id'], row['question'], row['answer'], 1))
+        if pending:
+            logger.info(f"Recovered {len(pending)} conversations pending relevance evaluation")
+        return len(pending)
+
+    def _recover_periodically(self):
+        while True:
+            time.sleep(max(self.recovery_age / 2, 1))
+            try:
+                self.recover_pending()
+            except Exception as e:
+                logger.error(f"Error recovering pending conversations: {e}")
+
+    def submit(self, conversation_id, question, answer, attempt=1):
+        try:
+            self.jobs.put_nowait((conversation_id, question, answer, attempt))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logger.warning(f"Evaluation queue full; conversation {conversation_id} stays PENDING")
+            return False
+
+    def _next_batch(self):
+        """Block for one job, then take whatever else arrives within batch_wait."""
+        jobs = [self.jobs.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(jobs) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(self.jobs.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = self._next_batch()
+            try:
+                results = evaluate_relevance_batch(
+                    [(question, answer) for _, question, answer, _ in jobs], batch_size=self.batch_size
+                )
+                for (conversation_id, _, answer, _), (relevance, explanation, eval_tokens) in zip(jobs, results):
+                    update_conversation_relevance(conversation_id, relevance, explanation, eval_tokens)
+                    record_judged_relevance(answer, relevance, explanation)
+                with self._lock:
+                    self.completed += len(jobs)
+                    self.eval_tokens += sum(tokens.get('total_tokens', 0) for _, _, tokens in results)
+            except Exception as e:
+                logger.error(f"Error evaluating conversations {[job[0] for job in jobs]}: {e}")
+                self._retry(jobs)
+            finally:
+                for _ in jobs:
+                    self.jobs.task_done()
+
+    def _retry(self, jobs):
+        """Queue failed jobs again after a backoff, or save them as UNKNOWN once out of attempts."""
+        for conversation_id, question, answer, attempt in jobs:
+            if attempt < self.max_attempts:
+                with self._lock:
+                    self.retried += 1
+                timer = threading.Timer(
+                    min(2 ** attempt, 60), self.submit, (conversation_id, question, answer, attempt + 1)
+                )
+                timer.daemon = True
+                timer.start()
+            else:
+                with self._lock:
+                    self.failed += 1
+                update_conversation_relevance(conversation_id, "UNKNOWN", "Evaluation failed", {})
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self.jobs.qsize(),
+                'completed': self.completed,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'retried': self.retried,
+                'eval_tokens_per_answer': self.eval_tokens / self.completed if self.completed else 0.0,
+            }
+
+
+_evaluator = None
+_evaluator_lock = threading.Lock()
+
+def get_evaluator():
+    """Process-wide evaluator, started (and pending rows recovered) on first use."""
+    global _evaluator
+    with _evaluator_lock:
+        if _evaluator is None:
+            _evaluator = RelevanceEvaluator()
+            _evaluator.start()
+        return _evaluator
+
+def schedule_evaluation(conversation_id, question, answer):
+    return get_evaluator().submit(conversation_id, question, answer)
@@ -0,0 +1,119 @@
+import os
+import re
+import json
+import logging
+
+from assistant import JUDGE_MODEL, RELEVANCE_LABELS, evaluate_relevance, llm
+
+logger = logging.getLogger(__name__)
+
+# (question, answer) pairs scored per judge request; 1 sends one request per answer
+JUDGE_BATCH_SIZE = int(os.getenv("JUDGE_BATCH_SIZE", "10"))
+
+BATCH_JUDGE_PROMPT = """
+You are an expert evaluator for a Retrieval-Augmented Generation (RAG) system.
+Your task is to analyze the relevance of each generated answer to its question.
+Based on the relevance of the generated answer, you will classify each item
+as "NON_RELEVANT", "PARTLY_RELEVANT", or "RELEVANT". Judge every item independently.
+
+Here are the items for evaluation:
+
+{items}
+
+Provide your evaluation in parsable JSON without using code blocks, with exactly one entry per item id:
+
+{{
+  "evaluations": [
+    {{
+      "id": <item id>,
+      "Relevance": "NON_RELEVANT" | "PARTLY_RELEVANT" | "RELEVANT",
+      "Explanation": "[Provide a brief explanation for your evaluation]"
+    }}
+  ]
+}}
+""".strip()
+
+
+def split_tokens(tokens, n):
+    """Share one request's token usage evenly between n items (remainders go to the first ones)."""
+    shares = [{} for _ in range(n)]
+    for key, total in tokens.items():
+        base, remainder = divmod(total or 0, n)
+        for i, share in enumerate(shares):
+            share[key] = base + (1 if i < remainder else 0)
+    return shares
+
+def add_tokens(a, b):
+    return {key: a.get(key, 0) + b.get(key, 0) for key in set(a) | set(b)}
+
+def parse_batch_evaluation(evaluation, ids):
+    """Item id -> (relevance, explanation) for every well-formed item in a batched judge reply.
+
+    Tolerates code fences, a bare list instead of {"evaluations": [...]}, and
+    text around the JSON; items that are missing or malformed are left out.
+    """
+    text = re.sub(r"^```(?:json)?|```$", "", evaluation.strip(), flags=re.MULTILINE).strip()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # Fall back to the individual objects, e.g. when the reply was cut off mid-list
+        data = []
+        for match in re.finditer(r"\{[^{}]*\}", text):
+            try:
+                data.append(json.loads(match.group(0)))
+            except json.JSONDecodeError:
+                continue
+    if isinstance(data, dict):
+        data = data.get('evaluations', [])
+    if not isinstance(data, list):
+        return {}
+
+    parsed = {}
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        try:
+            item_id = int(item.get('id'))
+        except (TypeError, ValueError):
+            continue
+        relevance = item.get('Relevance')
+        if item_id in ids and relevance in RELEVANCE_LABELS:
+            parsed[item_id] = (relevance, item.get('Explanation', 'No explanation provided.'))
+    return parsed
+
+def evaluate_relevance_batch(items, batch_size=JUDGE_BATCH_SIZE):
+    """Judge many (question, answer) pairs with one request per batch.
+
+    Returns (relevance, explanation, eval_tokens) per item, in order. Each
+    item is charged an equal share of its batch request's tokens. Items the
+    reply does not cover are judged again one by one with evaluate_relevance,
+    and that call's tokens are added to the item. LLMError propagates.
+    """
+    results = []
+    for start in range(0, len(items), max(1, batch_size)):
+        results.extend(judge_batch(items[start:start + max(1, batch_size)]))
+    return results
+
+def judge_batch(items):
+    if len(items) == 1:
+        return [evaluate_relevance(*items[0])]
+
+    listing = "\n\n".join(
+        f"Item {i}:\nQuestion: {question}\nGenerated Answer: {answer}"
+        for i, (question, answer) in enumerate(items, start=1)
+    )
+    evaluation, tokens, _ = llm(BATCH_JUDGE_PROMPT.format(items=listing), JUDGE_MODEL)
+    ids = set(range(1, len(items) + 1))
+    parsed = parse_batch_evaluation(evaluation, ids)
+    if len(parsed) < len(items):
+        logger.warning(f"Batched judge reply covered {len(parsed)} of {len(items)} items; judging the rest one by one")
+
+    results = []
+    for i, ((question, answer), share) in enumerate(zip(items, split_tokens(tokens, len(items))), start=1):
+        if i in parsed:
+            relevance, explanation = parsed[i]
+            results.append((relevance, explanation, share))
+        else:
+            relevance, explanation, single_tokens = evaluate_relevance(question, answer)
+            results.append((relevance, explanation, add_tokens(share, single_tokens)))
+    return results
@@ -0,0 +1,183 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from benchmark_utils import percentile
+
+logger = logging.getLogger(__name__)
+
+# Seconds a request may take end to end; 0 disables degradation
+LATENCY_BUDGET = float(os.getenv("LATENCY_BUDGET", "0"))
+# Degradations in the order they are applied when the projected time does not fit the budget
+DEGRADATION_ORDER = [
+    name for name in os.getenv("DEGRADATION_ORDER", "keyword_search,trim_context,fast_model,skip_judge").split(",")
+    if name
+]
+LATENCY_FAST_MODEL = os.getenv("LATENCY_FAST_MODEL", "llama3-8b-8192")
+# Share of the model's context token budget kept by trim_context
+LATENCY_TRIM_FRACTION = float(os.getenv("LATENCY_TRIM_FRACTION", "0.5"))
+# Percentile of recent stage durations used as the estimate for the next request
+LATENCY_ESTIMATE_PERCENTILE = float(os.getenv("LATENCY_ESTIMATE_PERCENTILE", "90"))
+
+# Pipeline stages in order, and the stage at which each degradation takes effect
+STAGES = ("search", "prompt", "answer", "judge")
+# (the model is chosen before the prompt is built, since its context budget depends on it)
+DEGRADATION_STAGES = {
+    "keyword_search": "search",
+    "trim_context": "prompt",
+    "fast_model": "prompt",
+    "skip_judge": "judge",
+}
+
+# Seconds assumed for a stage until enough durations have been observed
+DEFAULT_ESTIMATES = {"vector_search": 0.5, "keyword_search": 0.2, "answer_llm": 4.0, "judge_llm": 2.0}
+# Assumed speed-up of a trimmed-context answer over a full one, until trimmed answers have been observed
+TRIMMED_ANSWER_FACTOR = 0.8
+MIN_SAMPLES = 5
+
+
+class StageEstimates:
+    """Recent stage durations shared by all requests in the process."""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._durations = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, duration):
+        with self._lock:
+            self._durations.setdefault(key, deque(maxlen=self.window)).append(duration)
+
+    def observed(self, key):
+        """Estimated seconds for `key`, or None while too few durations have been recorded."""
+        with self._lock:
+            durations = list(self._durations.get(key, ()))
+        if len(durations) < MIN_SAMPLES:
+            return None
+        return percentile(durations, LATENCY_ESTIMATE_PERCENTILE)
+
+    def search(self, degraded):
+        key = "keyword_search" if degraded else "vector_search"
+        estimate = self.observed(key)
+        return DEFAULT_ESTIMATES[key] if estimate is None else estimate
+
+    def answer(self, model_choice, trimmed):
+        if trimmed:
+            estimate = self.observed(answer_key(model_choice, True))
+            if estimate is not None:
+                return estimate
+            return self.answer(model_choice, False) * TRIMMED_ANSWER_FACTOR
+        estimate = self.observed(answer_key(model_choice, False))
+        return DEFAULT_ESTIMATES["answer_llm"] if estimate is None else estimate
+
+    def judge(self):
+        estimate = self.observed("judge_llm")
+        return DEFAULT_ESTIMATES["judge_llm"] if estimate is None else estimate
+
+    def stats(self):
+        with self._lock:
+            keys = list(self._durations)
+        return {key: self.observed(key) for key in keys}
+
+
+def answer_key(model_choice, trimmed):
+    return f"answer_llm:{model_choice}:{'trimmed' if trimmed else 'full'}"
+
+stage_estimates = StageEstimates()
+
+@contextmanager
+def observe(key):
+    """Record the duration of the enclosed block (failed ones too) as a `key` estimate sample."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_estimates.record(key, time.perf_counter() - start_time)
+
+
+class LatencyBudget:
+    """Deadline for one get_answer call and the degradations taken to meet it.
+
+    Before each stage, plan(stage) projects the time of the remaining stages
+    from recent durations. While the projection exceeds what is left of the
+    budget, degradations are taken in DEGRADATION_ORDER. Those belonging to a
+    later stage are only counted as planned; they are applied when their
+    stage comes, if they are still needed by then.
+    """
+
+    def __init__(self, budget, model_choice, search_type, judge_inline, start_time=None, order=None,
+                 fast_model=LATENCY_FAST_MODEL):
+        self.budget = budget
+        self.model_choice = model_choice
+        self.search_type = search_type
+        self.judge_inline = judge_inline
+        self.start_time = time.time() if start_time is None else start_time
+        self.order = DEGRADATION_ORDER if order is None else order
+        self.fast_model = fast_model
+        self.applied = []
+
+    @property
+    def enabled(self):
+        return self.budget > 0
+
+    def remaining(self):
+        return self.budget - (time.time() - self.start_time)
+
+    def available(self, name, stage):
+        if STAGES.index(DEGRADATION_STAGES.get(name, stage)) < STAGES.index(stage):
+            return False  # Its stage has already run
+        if name == "keyword_search":
+            return self.search_type == "Vector"
+        if name == "fast_model":
+            return bool(self.fast_model) and self.fast_model != self.model_choice
+        if name == "skip_judge":
+            return self.judge_inline
+        return name in DEGRADATION_STAGES
+
+    def projected(self, stage, planned):
+        """Estimated seconds for `stage` and the stages after it, with the `planned` degradations."""
+        remaining_stages = STAGES[STAGES.index(stage):]
+        total = 0.0
+        if "search" in remaining_stages:
+            total += stage_estimates.search(self.search_type != "Vector" or "keyword_search" in planned)
+        if "answer" in remaining_stages:
+            model_choice = self.fast_model if "fast_model" in planned else self.model_choice
+            total += stage_estimates.answer(model_choice, "trim_context" in planned)
+        if "judge" in remaining_stages and self.judge_inline and "skip_judge" not in planned:
+            total += stage_estimates.judge()
+        return total
+
+    def plan(self, stage):
+        """Apply the degradations needed at `stage`; returns the names applied now."""
+        if not self.enabled:
+            return []
+        planned = set(self.applied)
+        remaining = self.remaining()
+        for name in self.order:
+            if self.projected(stage, planned) <= remaining:
+                break
+            if name not in planned and self.available(name, stage):
+                planned.add(name)
+        now = [name for name in self.order if name in planned - set(self.applied) and DEGRADATION_STAGES[name] == stage]
+        for name in now:
+            logger.info(f"Latency budget: {name} ({remaining:.2f}s left of {self.budget:.2f}s)")
+            self.applied.append(name)
+        return now
+
+    def degraded(self, name):
+        return name in self.applied
+
+    @property
+    def trimmed(self):
+        return self.degraded("trim_context")
+
+    @property
+    def search_type_used(self):
+        return "Text" if self.degraded("keyword_search") else self.search_type
+
+    @property
+    def model_used(self):
+        return self.fast_model if self.degraded("fast_model") else self.model_choice
@@ -0,0 +1,331 @@
+import os
+import time
+import asyncio
+import random
+import logging
+import threading
+from collections import deque
+
+import httpx
+import openai
+import groq
+from openai import AsyncOpenAI, OpenAI
+from groq import AsyncGroq, Groq
+from dotenv import load_dotenv
+
+from benchmark_utils import percentile
+from resources import lazy_resource
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Timeouts in seconds; the read timeout applies between received bytes, so long streams are fine
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+# Keep-alive connection pool per provider, shared by all sessions in the process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+# Retries of transient and rate-limit errors with jittered exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+# Circuit breaker: open after this many consecutive failures, probe again after the reset timeout
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "5"))
+LLM_CIRCUIT_RESET = float(os.getenv("LLM_CIRCUIT_RESET", "30"))
+# Point both providers at e.g. stub_llm_server.py (OPENAI_BASE_URL=http://localhost:8001/v1, GROQ_BASE_URL=http://localhost:8001)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+CONNECTION_ERRORS = (
+    openai.APIConnectionError, groq.APIConnectionError, httpx.TimeoutException, httpx.TransportError,
+)
+STATUS_ERRORS = (openai.APIStatusError, groq.APIStatusError)
+
+# Latencies kept per provider for the percentile counters
+LATENCY_WINDOW = 1000
+
+
+class LLMError(Exception):
+    """An LLM request failed after retries, or was rejected by an open circuit."""
+
+
+class CircuitOpenError(LLMError):
+    pass
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Closed: requests pass. After `failure_threshold` consecutive failures it
+    opens and rejects requests for `reset_timeout` seconds, then lets a single
+    probe through (half-open); the probe's outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=LLM_CIRCUIT_FAILURES, reset_timeout=LLM_CIRCUIT_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        """End a probe that was interrupted (e.g. cancelled) without an outcome; the next request probes instead."""
+        with self._lock:
+            self._probing = False
+
+
+def is_provider_error(error):
+    """Whether `error` came from talking to the provider (as opposed to e.g. a bug or the caller's callback)."""
+    return isinstance(error, CONNECTION_ERRORS + STATUS_ERRORS)
+
+def is_retryable(error):
+    if isinstance(error, CONNECTION_ERRORS):
+        return True
+    if isinstance(error, STATUS_ERRORS):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+def backoff_delay(attempt, error=None):
+    """Full-jitter exponential backoff, honouring a server's Retry-After when it is larger."""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, min(LLM_BACKOFF_MAX, float(retry_after)))
+        except ValueError:
+            pass
+    return delay
+
+def http_client_options():
+    return {
+        'timeout': httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        'limits': httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+    }
+
+def create_http_client():
+    return httpx.Client(**http_client_options())
+
+def create_async_http_client():
+    # Bound to the event loop it is first used on (the API server's)
+    return httpx.AsyncClient(**http_client_options())
+
+
+class ProviderClient:
+    """An LLM provider's SDK clients with retries, a circuit breaker and counters.
+
+    The SDK's own retries are disabled so that every attempt is counted and
+    goes through the breaker. The sync and async clients share the breaker
+    and counters.
+    """
+
+    def __init__(self, name, factory, async_factory=None, max_retries=LLM_MAX_RETRIES):
+        self.name = name
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker()
+        self._client = lazy_resource(name, factory)
+        self._async_client = lazy_resource(f"{name}_async", async_factory) if async_factory else None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def client(self):
+        return self._client.get()
+
+    @property
+    def async_client(self):
+        return self._async_client.get()
+
+    def _start(self, resource):
+        with self._lock:
+            self.requests += 1
+        try:
+            return resource.get()
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            raise LLMError(f"{self.name} client unavailable: {e}") from e
+
+    def _check_circuit(self):
+        if not self.breaker.allow():
+            with self._lock:
+                self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open after repeated failures")
+
+    def _retry_delay(self, error, attempt, can_retry):
+        """Seconds to wait before retrying provider `error`; raises LLMError when it should not be retried."""
+        retryable = is_retryable(error)
+        if retryable:
+            self.breaker.record_failure()
+        else:
+            # The provider answered (e.g. a 400); that says nothing about its health
+            self.breaker.record_success()
+        if retryable and attempt < self.max_retries and can_retry():
+            delay = backoff_delay(attempt, error)
+            logger.warning(f"{self.name} request failed ({error}); retry {attempt + 1} in {delay:.2f}s")
+            with self._lock:
+                self.retries += 1
+            return delay
+        with self._lock:
+            self.failures += 1
+        raise LLMError(f"{self.name} request failed: {error}") from error
+
+    def _succeeded(self, start_time):
+        self.breaker.record_success()
+        with self._lock:
+            self.successes += 1
+            self.latencies.append(time.time() - start_time)
+
+    def call(self, request, can_retry=lambda: True):
+        """Run request(client), retrying transient errors while can_retry() is true.
+
+        Raises LLMError once retries are exhausted, on a non-retryable provider
+        error, or straight away when the circuit is open. Other exceptions
+        raised by request (bugs, callbacks) propagate unchanged.
+        """
+        client = self._start(self._client)
+        attempt = 0
+        while True:
+            self._check_circuit()
+            start_time = time.time()
+            try:
+                result = request(client)
+            except Exception as e:
+                if not is_provider_error(e):
+                    # Not the provider's doing (e.g. a bug, or on_token failing on a closed client): no verdict
+                    self.breaker.release_probe()
+                    raise
+                time.sleep(self._retry_delay(e, attempt, can_retry))
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled or interrupted: no verdict on the provider, but a half-open probe must not stay taken
+                self.breaker.release_probe()
+                raise
+            self._succeeded(start_time)
+            return result
+
+    async def call_async(self, request, can_retry=lambda: True):
+        """Like call, with `request` a coroutine function of the async client."""
+        client = self._start(self._async_client)
+        attempt = 0
+        while True:
+            self._check_circuit()
+            start_time = time.time()
+            try:
+                result = await request(client)
+            except Exception as e:
+                if not is_provider_error(e):
+                    # Not the provider's doing (e.g. a bug, or on_token failing on a closed client): no verdict
+                    self.breaker.release_probe()
+                    raise
+                await asyncio.sleep(self._retry_delay(e, attempt, can_retry))
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled or interrupted: no verdict on the provider, but a half-open probe must not stay taken
+                self.breaker.release_probe()
+                raise
+            self._succeeded(start_time)
+            return result
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self.latencies)
+            stats = {
+                'requests': self.requests,
+                'successes': self.successes,
+                'failures': self.failures,
+                'retries': self.retries,
+                'rejected': self.rejected,
+            }
+        stats.update({
+            'circuit': self.breaker.state,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+        })
+        return stats
+
+
+def create_openai_client():
+    return OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL,
+        http_client=create_http_client(), max_retries=0,
+    )
+
+def create_async_openai_client():
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL,
+        http_client=create_async_http_client(), max_retries=0,
+    )
+
+def groq_api_key():
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise LLMError("Groq API key missing. Unable to initialize Groq client.")
+    return api_key
+
+def create_groq_client():
+    return Groq(api_key=groq_api_key(), base_url=GROQ_BASE_URL, http_client=create_http_client(), max_retries=0)
+
+def create_async_groq_client():
+    return AsyncGroq(
+        api_key=groq_api_key(), base_url=GROQ_BASE_URL, http_client=create_async_http_client(), max_retries=0,
+    )
+
+PROVIDERS = {
+    'openai': ProviderClient("openai", create_openai_client, create_async_openai_client),
+    'groq': ProviderClient("groq", create_groq_client, create_async_groq_client),
+}
+
+def get_provider(name):
+    return PROVIDERS[name]
+
+def llm_client_stats():
+    """Per-provider request, retry, failure and latency counters."""
+    return {name: provider.stats() for name, provider in PROVIDERS.items()}
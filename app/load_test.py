@@ -0,0 +1,296 @@
+"""Drive concurrent simulated sessions through get_answer and save_conversation.
+
+Each session thread repeatedly asks a random ground-truth question, saves the
+conversation (and queues it for the judge when it is PENDING), then waits
+--think-time seconds. Every --sessions level runs for --duration seconds and
+reports throughput, latency percentiles, errors and per-dependency
+saturation: how much each dependency's stage time grew over the first level,
+plus LLM client counters, the database writer's own write time per row and the peak depth of the database writer and judge
+queues. The knee is the last level that still raised throughput by
+--knee-gain.
+
+Dependencies are local stand-ins: --stub-llm runs stub_llm_server in-process
+(or point OPENAI_BASE_URL/GROQ_BASE_URL at one), --backend memory searches in
+process, and --db postgres writes to the local Postgres container (--db none
+skips the writes). The answer cache is off unless --answer-cache is given.
+
+Example:
+    python load_test.py --stub-llm --llm-latency 0.5 --backend memory --sessions 1 4 16 32 --duration 30
+"""
+import os
+import time
+import uuid
+import random
+import argparse
+import logging
+import threading
+
+from benchmark_utils import GROUND_TRUTH_PATH, configure_before_import, latency_summary, load_ground_truth, write_json
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Stages recorded by tracing.span, grouped by the dependency they wait on
+DEPENDENCY_STAGES = {
+    'encoder': ['query_encoding'],
+    'search': ['knn_keyword_msearch', 'keyword_search', 'knn_search', 'document_fetch', 'rrf_fusion'],
+    'llm': ['answer_llm', 'judge_llm'],
+    # Synchronous writes only; with the background writer, its batch write time per row is added instead
+    'postgres': ['db_save'],
+}
+LLM_COUNTERS = ('requests', 'successes', 'failures', 'retries', 'rejected')
+
+
+class LevelRun:
+    """Outcomes of one concurrency level, collected from the session threads."""
+
+    def __init__(self):
+        self.latencies = []
+        self.first_token_times = []
+        self.errors = {}
+        self.stage_totals = {}
+        self.degradations = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency, answer_data=None, error=None):
+        with self._lock:
+            self.requests += 1
+            if error is not None:
+                self.errors[error] = self.errors.get(error, 0) + 1
+                return
+            self.latencies.append(latency)
+            self.first_token_times.append(answer_data.get('first_token_time') or latency)
+            for stage, ms in answer_data['stage_timings'].items():
+                self.stage_totals[stage] = self.stage_totals.get(stage, 0.0) + ms
+            for name in answer_data.get('degradations', ()):
+                self.degradations[name] = self.degradations.get(name, 0) + 1
+
+
+class QueueSampler:
+    """Samples the peak depth of the database writer and judge queues during a level."""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peaks = {'db_writer': 0, 'evaluator': 0}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="queue-sampler", daemon=True)
+
+    def _run(self):
+        from assistant import EVALUATION_MODE
+        from db import DB_WRITE_MODE, db_writer
+        from evaluator import get_evaluator
+        while not self._stop.wait(self.interval):
+            if DB_WRITE_MODE == "async" and db_writer.initialized:
+                self.peaks['db_writer'] = max(self.peaks['db_writer'], db_writer.get().stats()['queued'])
+            if EVALUATION_MODE == "async":
+                self.peaks['evaluator'] = max(self.peaks['evaluator'], get_evaluator().stats()['queued'])
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_session(questions, args, run, stop):
+    from assistant import PENDING_RELEVANCE, get_answer
+    from db import DB_WRITE_MODE, save_conversation
+    from evaluator import schedule_evaluation
+    from llm_clients import LLMError
+
+    while not stop.is_set():
+        question = random.choice(questions)
+        model_choice = random.choice(args.models)
+        on_token = (lambda text: None) if args.stream else None
+        start_time = time.perf_counter()
+        try:
+            answer_data = get_answer(question, model_choice, args.search_type, on_token=on_token)
+            if args.db != "none":
+                save_start = time.perf_counter()
+                conversation_id = str(uuid.uuid4())
+                save_conversation(conversation_id, question, answer_data)
+                if answer_data['relevance'] == PENDING_RELEVANCE:
+                    schedule_evaluation(conversation_id, question, answer_data['answer'])
+                # With the background writer, the request only waits to enqueue the rows
+                save_stage = 'db_enqueue' if DB_WRITE_MODE == "async" else 'db_save'
+                answer_data['stage_timings'][save_stage] = (time.perf_counter() - save_start) * 1000
+        except LLMError as e:
+            run.record(time.perf_counter() - start_time, error="llm")
+            logger.debug(f"LLM error: {e}")
+        except Exception as e:
+            run.record(time.perf_counter() - start_time, error=type(e).__name__)
+            logger.debug(f"Request failed: {e}")
+        else:
+            run.record(time.perf_counter() - start_time, answer_data)
+        stop.wait(args.think_time)
+
+def coalesced_count():
+    from assistant import coalescing_stats
+    return coalescing_stats()['coalesced']
+
+def db_writer_counters():
+    """Rows written and milliseconds spent writing by the background database writer, if it runs."""
+    from db import DB_WRITE_MODE, db_writer
+    if DB_WRITE_MODE != "async" or not db_writer.initialized:
+        return {'written': 0, 'write_ms': 0.0}
+    stats = db_writer.get().stats()
+    return {'written': stats['written'], 'write_ms': stats['write_ms']}
+
+def llm_counters():
+    from llm_clients import llm_client_stats
+    return {name: {key: stats[key] for key in LLM_COUNTERS} for name, stats in llm_client_stats().items()}
+
+def run_level(sessions, questions, args):
+    run = LevelRun()
+    stop = threading.Event()
+    llm_before = llm_counters()
+    coalesced_before = coalesced_count()
+    writer_before = db_writer_counters()
+    threads = [
+        threading.Thread(target=run_session, args=(questions, args, run, stop), name=f"session-{i}", daemon=True)
+        for i in range(sessions)
+    ]
+    start_time = time.perf_counter()
+    with QueueSampler() as sampler:
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    wall_time = time.perf_counter() - start_time
+
+    llm_after = llm_counters()
+    writer_after = db_writer_counters()
+    rows_written = writer_after['written'] - writer_before['written']
+    completed = len(run.latencies)
+    errors = sum(run.errors.values())
+    return {
+        'sessions': sessions,
+        'requests': run.requests,
+        'completed': completed,
+        'errors': run.errors,
+        'error_rate': errors / run.requests if run.requests else 0.0,
+        'throughput_rps': completed / wall_time if wall_time else 0.0,
+        'latency': latency_summary(run.latencies),
+        'first_token': latency_summary(run.first_token_times),
+        'stage_mean_ms': {stage: total / completed for stage, total in sorted(run.stage_totals.items())} if completed else {},
+        'llm': {
+            name: {key: llm_after[name][key] - llm_before[name][key] for key in LLM_COUNTERS}
+            for name in llm_after
+        },
+        'coalesced': coalesced_count() - coalesced_before,
+        'degradations': run.degradations,
+        'peak_queue_depth': sampler.peaks,
+        'db_write_ms_per_row': (writer_after['write_ms'] - writer_before['write_ms']) / rows_written if rows_written else None,
+    }
+
+def dependency_ms(result):
+    dependencies = {
+        dependency: sum(result['stage_mean_ms'].get(stage, 0.0) for stage in stages)
+        for dependency, stages in DEPENDENCY_STAGES.items()
+    }
+    dependencies['postgres'] += result.get('db_write_ms_per_row') or 0.0
+    return dependencies
+
+def add_saturation(results):
+    """Per-dependency mean time at each level relative to the first level (1.0 = no slowdown)."""
+    baseline = dependency_ms(results[0]) if results else {}
+    for result in results:
+        current = dependency_ms(result)
+        result['dependency_ms'] = current
+        result['dependency_slowdown'] = {
+            dependency: (current[dependency] / baseline[dependency]) if baseline.get(dependency) else None
+            for dependency in current
+        }
+
+def find_knee(results, min_gain):
+    """Sessions of the last level whose throughput rose by at least min_gain over the previous level."""
+    knee = results[0]['sessions'] if results else None
+    for previous, current in zip(results, results[1:]):
+        if previous['throughput_rps'] and current['throughput_rps'] / previous['throughput_rps'] - 1 < min_gain:
+            break
+        knee = current['sessions']
+    return knee
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test of get_answer and save_conversation.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16, 32], help="Concurrent sessions per level")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per level")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds a session waits between questions")
+    parser.add_argument("--models", nargs="+", default=["gpt-4o-mini"], help="Models picked at random per request")
+    parser.add_argument("--search-type", choices=["Text", "Vector"], default="Vector")
+    parser.add_argument("--stream", action="store_true", help="Stream completions (measures time to first token)")
+    parser.add_argument("--backend", choices=["elasticsearch", "memory"], default=os.getenv("SEARCH_BACKEND", "memory"))
+    parser.add_argument("--db", choices=["postgres", "none"], default="postgres")
+    parser.add_argument("--evaluation-mode", choices=["sync", "async"], default=os.getenv("EVALUATION_MODE", "async"))
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache enabled")
+    parser.add_argument("--stub-llm", action="store_true", help="Run stub_llm_server in-process")
+    parser.add_argument("--stub-port", type=int, default=8001)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Stub seconds before the response or first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Stub seconds between streamed tokens")
+    parser.add_argument("--answer-tokens", type=int, default=None, help="Stub words per answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub requests answered with a 500")
+    parser.add_argument("--knee-gain", type=float, default=0.1, help="Throughput gain below which a level is past the knee")
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH, help="Ground-truth questions CSV")
+    parser.add_argument("--output", default="load_test.json", help="Where to write JSON results")
+    args = parser.parse_args()
+
+    if args.stub_llm:
+        from stub_llm_server import start_server
+        start_server(
+            port=args.stub_port, latency=args.llm_latency, token_delay=args.token_delay,
+            answer_tokens=args.answer_tokens, error_rate=args.error_rate,
+        )
+        configure_before_import(
+            OPENAI_BASE_URL=f"http://127.0.0.1:{args.stub_port}/v1",
+            GROQ_BASE_URL=f"http://127.0.0.1:{args.stub_port}",
+            OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "stub"),
+            GROQ_API_KEY=os.getenv("GROQ_API_KEY", "stub"),
+        )
+    configure_before_import(SEARCH_BACKEND=args.backend, EVALUATION_MODE=args.evaluation_mode)
+    if not args.answer_cache:
+        configure_before_import(ANSWER_CACHE_SIZE=0)
+    from assistant import get_search_backend, search_elasticsearch
+    from db import flush_writes, init_db
+    from evaluator import get_evaluator
+
+    if args.db == "postgres":
+        init_db()
+    if args.evaluation_mode == "async":
+        get_evaluator()
+    questions = [record['question'] for record in load_ground_truth(args.ground_truth)]
+    # Load the encoder and backend before timing anything
+    get_search_backend()
+    search_elasticsearch(questions[0], args.search_type)
+
+    results = []
+    for sessions in args.sessions:
+        logger.info(f"Running {sessions} sessions for {args.duration:.0f}s")
+        results.append(run_level(sessions, questions, args))
+    if args.db == "postgres":
+        flush_writes()
+    evaluator_stats = get_evaluator().stats() if args.evaluation_mode == "async" else None
+    add_saturation(results)
+    knee = find_knee(results, args.knee_gain)
+
+    print(f"{'sessions':>8} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}  slowdown (x first level)")
+    for r in results:
+        slowdown = ", ".join(
+            f"{dependency} {value:.1f}" for dependency, value in r['dependency_slowdown'].items() if value is not None
+        )
+        print(f"{r['sessions']:>8} {r['throughput_rps']:>7.2f} {r['latency']['p50_ms']:>8.0f} "
+              f"{r['latency']['p95_ms']:>8.0f} {r['latency']['p99_ms']:>8.0f} {r['error_rate']:>7.1%}  {slowdown}")
+    print(f"Knee: {knee} sessions")
+    write_json(args.output, {
+        'backend': args.backend, 'search_type': args.search_type, 'models': args.models, 'db': args.db,
+        'evaluation_mode': args.evaluation_mode, 'stream': args.stream, 'duration': args.duration,
+        'think_time': args.think_time, 'stub_llm': args.stub_llm, 'knee_sessions': knee, 'evaluator': evaluator_stats, 'results': results,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for the advisory lock that serializes concurrent migration runs
+MIGRATION_LOCK_ID = 724519
+
+# Adds a signed delta of conversation rows (from `source`, with a `sign` column) to the per-minute rollups
+CONVERSATION_ROLLUP_UPSERT = """
+    INSERT INTO conversation_rollups AS r (
+        bucket, model_used, conversations, response_time_sum, prompt_tokens, completion_tokens,
+        total_tokens, eval_prompt_tokens, eval_completion_tokens, eval_total_tokens, openai_cost,
+        cache_hits, relevant, partly_relevant, non_relevant, pending
+    )
+    SELECT
+        date_trunc('minute', d.timestamp),
+        d.model_used,
+        SUM(d.sign),
+        SUM(d.sign * d.response_time),
+        SUM(d.sign * d.prompt_tokens),
+        SUM(d.sign * d.completion_tokens),
+        SUM(d.sign * d.total_tokens),
+        SUM(d.sign * d.eval_prompt_tokens),
+        SUM(d.sign * d.eval_completion_tokens),
+        SUM(d.sign * d.eval_total_tokens),
+        SUM(d.sign * d.openai_cost),
+        SUM(d.sign * CASE WHEN d.cache_hit THEN 1 ELSE 0 END),
+        SUM(d.sign * CASE WHEN d.relevance = 'RELEVANT' THEN 1 ELSE 0 END),
+        SUM(d.sign * CASE WHEN d.relevance = 'PARTLY_RELEVANT' THEN 1 ELSE 0 END),
+        SUM(d.sign * CASE WHEN d.relevance = 'NON_RELEVANT' THEN 1 ELSE 0 END),
+        SUM(d.sign * CASE WHEN d.relevance = 'PENDING' THEN 1 ELSE 0 END)
+    FROM ({source}) AS d
+    GROUP BY 1, 2
+    ON CONFLICT (bucket, model_used) DO UPDATE SET
+        conversations = r.conversations + EXCLUDED.conversations,
+        response_time_sum = r.response_time_sum + EXCLUDED.response_time_sum,
+        prompt_tokens = r.prompt_tokens + EXCLUDED.prompt_tokens,
+        completion_tokens = r.completion_tokens + EXCLUDED.completion_tokens,
+        total_tokens = r.total_tokens + EXCLUDED.total_tokens,
+        eval_prompt_tokens = r.eval_prompt_tokens + EXCLUDED.eval_prompt_tokens,
+        eval_completion_tokens = r.eval_completion_tokens + EXCLUDED.eval_completion_tokens,
+        eval_total_tokens = r.eval_total_tokens + EXCLUDED.eval_total_tokens,
+        openai_cost = r.openai_cost + EXCLUDED.openai_cost,
+        cache_hits = r.cache_hits + EXCLUDED.cache_hits,
+        relevant = r.relevant + EXCLUDED.relevant,
+        partly_relevant = r.partly_relevant + EXCLUDED.partly_relevant,
+        non_relevant = r.non_relevant + EXCLUDED.non_relevant,
+        pending = r.pending + EXCLUDED.pending
+"""
+
+FEEDBACK_ROLLUP_UPSERT = """
+    INSERT INTO feedback_rollups AS r (bucket, thumbs_up, thumbs_down)
+    SELECT
+        date_trunc('minute', f.timestamp),
+        SUM(CASE WHEN f.feedback > 0 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN f.feedback < 0 THEN 1 ELSE 0 END)
+    FROM {source} AS f
+    GROUP BY 1
+    ON CONFLICT (bucket) DO UPDATE SET
+        thumbs_up = r.thumbs_up + EXCLUDED.thumbs_up,
+        thumbs_down = r.thumbs_down + EXCLUDED.thumbs_down
+"""
+
+# (version, description, statements). Applied in order, each version once, never dropping data.
+MIGRATIONS = [
+    (1, "conversations and feedback", [
+        """
+        CREATE TABLE IF NOT EXISTS conversations (
+            id TEXT PRIMARY KEY,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            model_used TEXT NOT NULL,
+            response_time FLOAT NOT NULL,
+            relevance TEXT NOT NULL,
+            relevance_explanation TEXT NOT NULL,
+            prompt_tokens INTEGER NOT NULL,
+            completion_tokens INTEGER NOT NULL,
+            total_tokens INTEGER NOT NULL,
+            eval_prompt_tokens INTEGER NOT NULL,
+            eval_completion_tokens INTEGER NOT NULL,
+            eval_total_tokens INTEGER NOT NULL,
+            openai_cost FLOAT NOT NULL,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS feedback (
+            id SERIAL PRIMARY KEY,
+            conversation_id TEXT REFERENCES conversations(id),
+            feedback INTEGER NOT NULL,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (2, "cache hit and time-to-first-token columns", [
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS cache_hit BOOLEAN NOT NULL DEFAULT FALSE",
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS first_token_time FLOAT",
+    ]),
+    (3, "stage timings", [
+        """
+        CREATE TABLE IF NOT EXISTS stage_timings (
+            id SERIAL PRIMARY KEY,
+            conversation_id TEXT REFERENCES conversations(id),
+            stage TEXT NOT NULL,
+            duration_ms FLOAT NOT NULL,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (4, "indexes for history and dashboard queries", [
+        "CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations (timestamp DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_conversations_relevance_timestamp ON conversations (relevance, timestamp DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_conversations_pending ON conversations (timestamp) WHERE relevance = 'PENDING'",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_conversation_id ON feedback (conversation_id)",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_stage_timings_conversation_id ON stage_timings (conversation_id)",
+        "CREATE INDEX IF NOT EXISTS idx_stage_timings_timestamp ON stage_timings (timestamp)",
+    ]),
+    (5, "per-minute rollups maintained by triggers", [
+        """
+        CREATE TABLE IF NOT EXISTS conversation_rollups (
+            bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+            model_used TEXT NOT NULL,
+            conversations BIGINT NOT NULL DEFAULT 0,
+            response_time_sum FLOAT NOT NULL DEFAULT 0,
+            prompt_tokens BIGINT NOT NULL DEFAULT 0,
+            completion_tokens BIGINT NOT NULL DEFAULT 0,
+            total_tokens BIGINT NOT NULL DEFAULT 0,
+            eval_prompt_tokens BIGINT NOT NULL DEFAULT 0,
+            eval_completion_tokens BIGINT NOT NULL DEFAULT 0,
+            eval_total_tokens BIGINT NOT NULL DEFAULT 0,
+            openai_cost FLOAT NOT NULL DEFAULT 0,
+            cache_hits BIGINT NOT NULL DEFAULT 0,
+            relevant BIGINT NOT NULL DEFAULT 0,
+            partly_relevant BIGINT NOT NULL DEFAULT 0,
+            non_relevant BIGINT NOT NULL DEFAULT 0,
+            pending BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket, model_used)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS feedback_rollups (
+            bucket TIMESTAMP WITH TIME ZONE PRIMARY KEY,
+            thumbs_up BIGINT NOT NULL DEFAULT 0,
+            thumbs_down BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        f"""
+        CREATE OR REPLACE FUNCTION conversation_rollups_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                {CONVERSATION_ROLLUP_UPSERT.format(source="SELECT *, 1 AS sign FROM new_rows")};
+            ELSIF TG_OP = 'UPDATE' THEN
+                {CONVERSATION_ROLLUP_UPSERT.format(
+                    source="SELECT *, 1 AS sign FROM new_rows UNION ALL SELECT *, -1 AS sign FROM old_rows")};
+            ELSE
+                {CONVERSATION_ROLLUP_UPSERT.format(source="SELECT *, -1 AS sign FROM old_rows")};
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        f"""
+        CREATE OR REPLACE FUNCTION feedback_rollups_apply() RETURNS trigger AS $$
+        BEGIN
+            {FEEDBACK_ROLLUP_UPSERT.format(source="new_rows")};
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # Creating the triggers locks the tables against writes until commit, so the backfill below
+        # and the triggers together count every row exactly once
+        """
+        CREATE TRIGGER conversation_rollups_insert AFTER INSERT ON conversations
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION conversation_rollups_apply()
+        """,
+        """
+        CREATE TRIGGER conversation_rollups_update AFTER UPDATE ON conversations
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION conversation_rollups_apply()
+        """,
+        """
+        CREATE TRIGGER conversation_rollups_delete AFTER DELETE ON conversations
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION conversation_rollups_apply()
+        """,
+        """
+        CREATE TRIGGER feedback_rollups_insert AFTER INSERT ON feedback
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION feedback_rollups_apply()
+        """,
+        "TRUNCATE conversation_rollups, feedback_rollups",
+        CONVERSATION_ROLLUP_UPSERT.format(source="SELECT *, 1 AS sign FROM conversations"),
+        FEEDBACK_ROLLUP_UPSERT.format(source="feedback"),
+    ]),
+    (6, "prompt context size columns", [
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS context_docs INTEGER",
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS context_tokens INTEGER",
+    ]),
+    (7, "coalesced request column", [
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS coalesced BOOLEAN NOT NULL DEFAULT FALSE",
+    ]),
+    (8, "latency budget degradations column", [
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS degradations TEXT[] NOT NULL DEFAULT '{}'",
+    ]),
+    (9, "relevance evaluation claim column", [
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS evaluation_claimed_at TIMESTAMP WITH TIME ZONE",
+    ]),
+]
+
+
+def apply_migrations(conn):
+    """Apply pending MIGRATIONS, each in its own transaction. Returns the versions applied."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    conn.commit()
+
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        with conn.cursor() as cur:
+            # Serialize concurrent runs (e.g. several pods starting at once); released at commit
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+            if cur.fetchone():
+                conn.commit()
+                continue
+            logger.info(f"Applying migration {version}: {description}")
+            for statement in statements:
+                cur.execute(statement)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)", (version, description)
+            )
+        conn.commit()
+        applied.append(version)
+    return applied
@@ -0,0 +1,99 @@
+import os
+import logging
+import functools
+
+import tiktoken
+
+from search_backend import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Context tokens per model, e.g. CONTEXT_TOKEN_BUDGETS="gpt-4o-mini=1500,llama3-8b-8192=1000"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_TOKEN_BUDGETS = {
+    model: int(budget)
+    for model, budget in (
+        item.split("=", 1) for item in os.getenv("CONTEXT_TOKEN_BUDGETS", "").split(",") if "=" in item
+    )
+}
+# Word-set Jaccard similarity above which an entry counts as a near-duplicate of one already included
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+# tiktoken encoding per model; Groq's Llama models use their own tokenizer, cl100k_base is a close estimate
+MODEL_ENCODINGS = {'gpt-4o-mini': "o200k_base"}
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(name):
+    """tiktoken encoding, or None when it cannot be loaded (e.g. offline on first use)."""
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding {name} ({e}); estimating tokens from characters")
+        return None
+
+def count_tokens(text, model_choice=None):
+    encoding = get_encoding(MODEL_ENCODINGS.get(model_choice, DEFAULT_ENCODING))
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+def truncate_to_tokens(text, max_tokens, model_choice=None):
+    encoding = get_encoding(MODEL_ENCODINGS.get(model_choice, DEFAULT_ENCODING))
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+def token_budget(model_choice):
+    return CONTEXT_TOKEN_BUDGETS.get(model_choice, CONTEXT_TOKEN_BUDGET)
+
+def format_entry(doc):
+    return f"Category: {doc.get('Category', '')}\nQuestion: {doc.get('Question', '')}\nAnswer: {doc.get('Answer', '')}"
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def assemble_context(search_results, model_choice=None, budget=None, dedup_threshold=CONTEXT_DEDUP_THRESHOLD):
+    """Join retrieved FAQ entries into a prompt context within a token budget.
+
+    Entries are taken in retrieval (fused-score) order. Near-duplicates of an
+    entry already included are dropped, and entries that no longer fit are
+    skipped so a shorter lower-ranked one can still use the remaining budget.
+    If even the top entry does not fit, it is truncated rather than dropped.
+
+    Returns the context and stats: context_docs, context_tokens, and the
+    numbers of entries dropped as duplicates or for the budget.
+    """
+    if budget is None:
+        budget = token_budget(model_choice)
+    separator_tokens = count_tokens("\n\n", model_choice)
+    entries = []
+    seen = []
+    used = 0
+    duplicates = 0
+    over_budget = 0
+    for doc in search_results:
+        words = set(tokenize(f"{doc.get('Question', '')} {doc.get('Answer', '')}"))
+        if any(jaccard(words, other) >= dedup_threshold for other in seen):
+            duplicates += 1
+            continue
+        entry = format_entry(doc)
+        cost = count_tokens(entry, model_choice) + (separator_tokens if entries else 0)
+        if used + cost > budget:
+            if entries:
+                over_budget += 1
+                continue
+            entry = truncate_to_tokens(entry, budget, model_choice)
+            cost = count_tokens(entry, model_choice)
+        entries.append(entry)
+        seen.append(words)
+        used += cost
+    return "\n\n".join(entries), {
+        'context_docs': len(entries),
+        'context_tokens': used,
+        'context_duplicates': duplicates,
+        'context_over_budget': over_budget,
+    }
@@ -0,0 +1,106 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from cache import ScoreCache
+from resources import lazy_resource, warm_up_in_background
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Optional stage after retrieval: a local cross-encoder reorders the fused candidates
+RERANKING = os.getenv("RERANKING", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Documents kept after reranking
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))
+# Longest a request waits for scores before keeping the retrieval order
+RERANK_TIME_BUDGET_MS = float(os.getenv("RERANK_TIME_BUDGET_MS", "200"))
+# Concurrent scoring passes; requests that find them all busy skip reranking
+RERANK_WORKERS = int(os.getenv("RERANK_WORKERS", "1"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+
+
+def load_cross_encoder():
+    from sentence_transformers import CrossEncoder  # Imports torch; only needed when reranking
+    return CrossEncoder(RERANK_MODEL, device="cpu")
+
+_cross_encoder = lazy_resource("cross_encoder", load_cross_encoder)
+if RERANKING:
+    warm_up_in_background(["cross_encoder"])
+score_cache = ScoreCache(maxsize=RERANK_CACHE_SIZE)
+# Forward passes run here so a request can stop waiting without interrupting one;
+# a slot is held until its pass finishes, so abandoned passes cannot pile up
+_executor = ThreadPoolExecutor(max_workers=RERANK_WORKERS, thread_name_prefix="reranker")
+_slots = threading.BoundedSemaphore(RERANK_WORKERS)
+
+_lock = threading.Lock()
+_counts = {'reranked': 0, 'over_budget': 0, 'saturated': 0, 'failed': 0}
+
+
+def doc_key(doc):
+    return doc.get('doc_id') or doc.get('Question', '')
+
+def doc_text(doc):
+    return f"{doc.get('Question', '')}\n{doc.get('Answer', '')}"
+
+def score_documents(model, query, documents):
+    """Score every (query, document) pair in one batched forward pass and cache the scores."""
+    scores = model.predict(
+        [(query, doc_text(doc)) for doc in documents], batch_size=len(documents), show_progress_bar=False
+    )
+    scored = {doc_key(doc): float(score) for doc, score in zip(documents, scores)}
+    score_cache.put_many(RERANK_MODEL, query, scored)
+    return scored
+
+def count(name):
+    with _lock:
+        _counts[name] += 1
+
+def rerank(query, documents, top_n=RERANK_TOP_N, budget_ms=RERANK_TIME_BUDGET_MS):
+    """The top_n documents by cross-encoder score, or `documents` unchanged when reranking is skipped.
+
+    Cached scores are reused; only the remaining pairs are scored. Reranking
+    is skipped when every scoring slot is busy, or when the scores are not
+    ready within budget_ms. A pass that misses the budget still finishes and
+    fills the cache for the next time the question is asked.
+    """
+    if len(documents) <= 1:
+        return documents
+    with span("rerank"):
+        try:
+            # Loaded before the clock starts: the budget is for scoring, not for a cold start
+            model = _cross_encoder.get()
+        except Exception as e:
+            count('failed')
+            logger.error(f"Reranking failed: {e}")
+            return documents
+        scores = score_cache.get_many(RERANK_MODEL, query, [doc_key(doc) for doc in documents])
+        missing = [doc for doc in documents if doc_key(doc) not in scores]
+        if missing:
+            if not _slots.acquire(blocking=False):
+                count('saturated')
+                return documents
+            start_time = time.perf_counter()
+            future = _executor.submit(score_documents, model, query, missing)
+            future.add_done_callback(lambda _: _slots.release())
+            try:
+                scores.update(future.result(timeout=budget_ms / 1000))
+            except TimeoutError:
+                count('over_budget')
+                logger.warning(f"Reranking skipped: no scores after {(time.perf_counter() - start_time) * 1000:.0f} ms")
+                return documents
+            except Exception as e:
+                count('failed')
+                logger.error(f"Reranking failed: {e}")
+                return documents
+        count('reranked')
+        # Stable sort: ties keep their retrieval order
+        return sorted(documents, key=lambda doc: -scores[doc_key(doc)])[:top_n]
+
+def reranker_stats():
+    with _lock:
+        stats = dict(_counts)
+    stats['cache'] = score_cache.stats()
+    return stats
@@ -0,0 +1,78 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class LazyResource:
+    """A heavy resource created on first use and shared process-wide.
+
+    Initialization is guarded by a lock so concurrent Streamlit sessions build
+    it once. A failed initialization is logged and retried on the next call,
+    so a missing service only affects the features that need it.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.init_time = None
+        self.error = None
+        self._value = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self):
+        return self._initialized
+
+    def get(self):
+        if self._initialized:
+            return self._value
+        with self._lock:
+            if not self._initialized:
+                start_time = time.time()
+                try:
+                    self._value = self.factory()
+                except Exception as e:
+                    self.error = str(e)
+                    logger.error(f"Failed to initialize {self.name}: {e}")
+                    raise
+                self.init_time = time.time() - start_time
+                self.error = None
+                self._initialized = True
+                logger.info(f"Initialized {self.name} in {self.init_time:.2f}s")
+        return self._value
+
+
+def lazy_resource(name, factory):
+    """Create and register a LazyResource."""
+    resource = LazyResource(name, factory)
+    _registry[name] = resource
+    return resource
+
+def resource_stats():
+    """Initialization state and time of every registered resource."""
+    return {
+        name: {'initialized': resource.initialized, 'init_time': resource.init_time, 'error': resource.error}
+        for name, resource in _registry.items()
+    }
+
+def warm_up_in_background(names):
+    """Initialize the named resources on a daemon thread without delaying startup."""
+    def warm_up():
+        for name in names:
+            resource = _registry.get(name)
+            if resource is None:
+                logger.warning(f"Unknown resource for warm-up: {name}")
+                continue
+            try:
+                resource.get()
+            except Exception:
+                pass  # Already logged; the resource is retried on first use
+
+    thread = threading.Thread(target=warm_up, name="resource-warm-up", daemon=True)
+    thread.start()
+    return thread
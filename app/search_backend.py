@@ -0,0 +1,338 @@
+import os
+import re
+import json
+import math
+import asyncio
+import logging
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from embedding_store import FIELD_TEXTS
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# FAQ documents served by the memory backend and used by the evaluation tools
+DOCUMENTS_PATH = os.getenv(
+    "DOCUMENTS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data_prep", "final_data.json"),
+)
+
+# Embedding fields excluded from returned documents
+VECTOR_FIELDS = ["question_vector", "text_vector", "question_text_vector"]
+
+# Fields queried by the hybrid keyword leg and by plain Text search, with boosts
+HYBRID_KEYWORD_FIELDS = {"Question": 1.0, "Answer": 1.0, "Category": 1.0}
+TEXT_SEARCH_FIELDS = {"Question": 3.0, "Answer": 1.0, "Category": 1.0}
+
+# Hybrid (Vector) search: kNN neighbours and HNSW candidates per shard, hits per leg,
+# documents kept after fusion, and the RRF rank constant
+HYBRID_SEARCH_PARAMS = {"k": 10, "num_candidates": 10000, "knn_size": 10, "keyword_size": 10, "top_n": 5, "rrf_k": 60}
+# Text search: documents returned
+TEXT_SEARCH_PARAMS = {"size": 5}
+
+
+def search_params(defaults, overrides):
+    """defaults updated with overrides; unknown names raise ValueError."""
+    unknown = set(overrides) - set(defaults)
+    if unknown:
+        raise ValueError(f"Unknown search parameters: {', '.join(sorted(unknown))} (expected {', '.join(defaults)})")
+    params = {**defaults, **overrides}
+    if "num_candidates" in params and params["num_candidates"] < params["k"]:
+        raise ValueError("num_candidates must be at least k")
+    return params
+
+
+def compute_rrf(rank, k=60):
+    """Compute Reciprocal Rank Fusion score."""
+    return 1 / (k + rank)
+
+def rrf_fuse(result_lists, k=60, top_n=5):
+    """Fuse ranked lists of (doc_id, source) pairs; returns the top_n (doc_id, source) pairs."""
+    rrf_scores = {}
+    sources = {}
+    for results in result_lists:
+        for rank, (doc_id, source) in enumerate(results):
+            rrf_scores[doc_id] = rrf_scores.get(doc_id, 0) + compute_rrf(rank + 1, k)
+            sources[doc_id] = sources.get(doc_id) or source
+
+    reranked_docs = sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)
+    return [(doc_id, sources[doc_id]) for doc_id, _ in reranked_docs[:top_n]]
+
+
+class SearchBackend:
+    """Retrieval interface used by assistant.search_elasticsearch."""
+
+    def keyword_search(self, query, size=5):
+        """Text search over Question (boosted), Answer and Category."""
+        raise NotImplementedError
+
+    def hybrid_search(self, field, query, vector, params=HYBRID_SEARCH_PARAMS):
+        """kNN on `field` plus keyword search, fused with RRF; returns the top params['top_n'] documents."""
+        raise NotImplementedError
+
+    async def keyword_search_async(self, query, size=5):
+        """keyword_search for the event loop; runs on a worker thread unless overridden."""
+        return await asyncio.to_thread(self.keyword_search, query, size)
+
+    async def hybrid_search_async(self, field, query, vector, params=HYBRID_SEARCH_PARAMS):
+        """hybrid_search for the event loop; runs on a worker thread unless overridden."""
+        return await asyncio.to_thread(self.hybrid_search, field, query, vector, params)
+
+
+class ElasticsearchBackend(SearchBackend):
+    """Searches an Elasticsearch index.
+
+    get_async_client, when given, returns an AsyncElasticsearch client used by
+    the *_async methods so they do not tie up a thread per request.
+    """
+
+    def __init__(self, es_client, index_name, get_async_client=None):
+        self.es_client = es_client
+        self.index_name = index_name
+        self.get_async_client = get_async_client
+
+    def keyword_body(self, query, size):
+        return {
+            "size": size,
+            "query": {
+                "bool": {
+                    "must": {
+                        "multi_match": {
+                            "query": query,
+                            "fields": ["Question^3", "Answer", "Category"],
+                            "type": "best_fields",
+                        }
+                    }
+                },
+            }
+        }
+
+    def hybrid_searches(self, field, query, vector, params):
+        """msearch body for the kNN and keyword legs of a hybrid search."""
+        # KNN Query
+        knn_query = {
+            "field": field,
+            "query_vector": vector,
+            "k": params["k"],
+            "num_candidates": params["num_candidates"],
+            "boost": 0.5
+        }
+
+        # Keyword Query
+        keyword_query = {
+            "bool": {
+                "must": {
+                    "multi_match": {
+                        "query": query,
+                        "fields": ["Question", "Answer", "Category"],
+                        "type": "best_fields",
+                        "boost": 0.5
+                    }
+                }
+            }
+        }
+
+        source = {"excludes": VECTOR_FIELDS}
+        return [
+            {"index": self.index_name},
+            {"knn": knn_query, "size": params["knn_size"], "_source": source},
+            {"index": self.index_name},
+            {"query": keyword_query, "size": params["keyword_size"], "_source": source},
+        ]
+
+    def fuse_legs(self, responses, params):
+        """RRF-fused (doc_id, source) pairs from the msearch responses."""
+        leg_hits = []
+        for response in responses:
+            if 'error' in response:
+                logger.error(f"Hybrid search leg failed: {response['error']}")
+                leg_hits.append([])
+            else:
+                leg_hits.append([(hit['_id'], hit.get('_source')) for hit in response['hits']['hits']])
+
+        with span("rrf_fusion"):
+            return rrf_fuse(leg_hits, k=params["rrf_k"], top_n=params["top_n"])
+
+    def keyword_search(self, query, size=5):
+        with span("keyword_search"):
+            response = self.es_client.search(index=self.index_name, body=self.keyword_body(query, size))
+        return [hit["_source"] for hit in response["hits"]["hits"]]
+
+    def hybrid_search(self, field, query, vector, params=HYBRID_SEARCH_PARAMS):
+        # KNN and keyword searches in a single round trip
+        with span("knn_keyword_msearch"):
+            responses = self.es_client.msearch(searches=self.hybrid_searches(field, query, vector, params))['responses']
+        fused = self.fuse_legs(responses, params)
+
+        # Hits normally carry their _source; fetch any that do not in one request
+        fetched = []
+        missing = missing_sources(fused)
+        if missing:
+            with span("document_fetch"):
+                fetched = self.es_client.mget(index=self.index_name, ids=missing, _source_excludes=VECTOR_FIELDS)['docs']
+        return merge_sources(fused, fetched)
+
+    async def keyword_search_async(self, query, size=5):
+        if self.get_async_client is None:
+            return await super().keyword_search_async(query, size)
+        with span("keyword_search"):
+            response = await self.get_async_client().search(index=self.index_name, body=self.keyword_body(query, size))
+        return [hit["_source"] for hit in response["hits"]["hits"]]
+
+    async def hybrid_search_async(self, field, query, vector, params=HYBRID_SEARCH_PARAMS):
+        if self.get_async_client is None:
+            return await super().hybrid_search_async(field, query, vector, params)
+        es_client = self.get_async_client()
+        with span("knn_keyword_msearch"):
+            responses = (await es_client.msearch(searches=self.hybrid_searches(field, query, vector, params)))['responses']
+        fused = self.fuse_legs(responses, params)
+
+        fetched = []
+        missing = missing_sources(fused)
+        if missing:
+            with span("document_fetch"):
+                fetched = (await es_client.mget(index=self.index_name, ids=missing, _source_excludes=VECTOR_FIELDS))['docs']
+        return merge_sources(fused, fetched)
+
+
+def missing_sources(fused):
+    """doc_ids of fused (doc_id, source) pairs whose hit came without its _source."""
+    return [doc_id for doc_id, source in fused if not source]
+
+def merge_sources(fused, fetched):
+    """Sources of the fused hits in rank order, filled in from mget docs; documents not found are left out."""
+    sources = dict(fused)
+    sources.update({doc['_id']: doc.get('_source') for doc in fetched if doc.get('found')})
+    return [sources[doc_id] for doc_id, _ in fused if sources.get(doc_id)]
+
+
+def tokenize(text):
+    """Lowercased word tokens, close to the Elasticsearch standard analyzer."""
+    return re.findall(r"\w+", text.lower())
+
+
+class BM25Index:
+    """In-memory BM25 over several text fields, scored like a best_fields multi_match."""
+
+    def __init__(self, documents, fields, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(documents)
+        self.postings = {}
+        self.doc_lengths = {}
+        self.avg_lengths = {}
+        for field in fields:
+            postings = defaultdict(list)
+            lengths = []
+            for i, doc in enumerate(documents):
+                tokens = tokenize(doc.get(field, ''))
+                lengths.append(len(tokens))
+                for term, tf in Counter(tokens).items():
+                    postings[term].append((i, tf))
+            self.postings[field] = dict(postings)
+            self.doc_lengths[field] = lengths
+            self.avg_lengths[field] = (sum(lengths) / len(lengths)) if lengths else 0
+
+    def _idf(self, doc_freq):
+        return math.log(1 + (self.num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def _field_scores(self, field, terms):
+        scores = defaultdict(float)
+        postings = self.postings[field]
+        lengths = self.doc_lengths[field]
+        avg_length = self.avg_lengths[field] or 1
+        for term in terms:
+            term_postings = postings.get(term)
+            if not term_postings:
+                continue
+            idf = self._idf(len(term_postings))
+            for i, tf in term_postings:
+                norm = self.k1 * (1 - self.b + self.b * lengths[i] / avg_length)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query, field_boosts, size=10):
+        """Return [(doc_index, score)] ranked by the best boosted field score."""
+        terms = tokenize(query)
+        best = {}
+        for field, boost in field_boosts.items():
+            for i, score in self._field_scores(field, terms).items():
+                best[i] = max(best.get(i, 0.0), boost * score)
+        return sorted(best.items(), key=lambda x: x[1], reverse=True)[:size]
+
+
+class InMemoryBackend(SearchBackend):
+    """Embedded backend for small corpora: NumPy cosine top-k plus in-memory BM25."""
+
+    def __init__(self, documents, model, fields=("question_text_vector",), store=None):
+        self.documents = documents
+        self.model = model
+        self.store = store
+        self.doc_ids = [doc['doc_id'] for doc in documents]
+        self.bm25 = BM25Index(documents, sorted(set(HYBRID_KEYWORD_FIELDS) | set(TEXT_SEARCH_FIELDS)))
+        self.vectors = {}
+        for field in fields:
+            self._field_matrix(field)
+        logger.info(f"In-memory search backend ready with {len(documents)} documents")
+
+    def _field_matrix(self, field):
+        """Normalized embedding matrix for `field`, computed on first use."""
+        if field not in self.vectors:
+            if self.store is not None:
+                matrix = self.store.get_embeddings(self.documents, self.model)[field]
+            else:
+                texts = [FIELD_TEXTS[field](doc) for doc in self.documents]
+                matrix = np.asarray(self.model.encode(texts, batch_size=64), dtype=np.float32)
+            self.vectors[field] = normalize_rows(matrix)
+        return self.vectors[field]
+
+    def _source(self, i):
+        return {key: value for key, value in self.documents[i].items() if key not in VECTOR_FIELDS}
+
+    def knn(self, field, vector, k=10):
+        matrix = self._field_matrix(field)
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = matrix @ query
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])].tolist()
+
+    def keyword_search(self, query, size=5):
+        with span("keyword_search"):
+            return [self._source(i) for i, _ in self.bm25.search(query, TEXT_SEARCH_FIELDS, size=size)]
+
+    def hybrid_search(self, field, query, vector, params=HYBRID_SEARCH_PARAMS):
+        # Exact search, so num_candidates does not apply
+        with span("knn_search"):
+            knn_results = [
+                (self.doc_ids[i], self._source(i))
+                for i in self.knn(field, vector, k=min(params["k"], params["knn_size"]))
+            ]
+        with span("keyword_search"):
+            keyword_results = [
+                (self.doc_ids[i], self._source(i))
+                for i, _ in self.bm25.search(query, HYBRID_KEYWORD_FIELDS, size=params["keyword_size"])
+            ]
+        with span("rrf_fusion"):
+            fused = rrf_fuse([knn_results, keyword_results], k=params["rrf_k"], top_n=params["top_n"])
+            return [source for _, source in fused]
+
+
+def normalize_rows(matrix):
+    """Unit-normalize rows; already-normalized (e.g. memory-mapped) matrices are returned as is."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    if np.allclose(norms, 1.0, atol=1e-4):
+        return matrix
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def load_documents(path):
+    with open(path, 'r') as f:
+        documents = json.load(f)
+    logger.info(f"Loaded {len(documents)} documents from {path}")
+    return documents
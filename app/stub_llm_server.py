@@ -0,0 +1,169 @@
+"""Local stand-in for the OpenAI/Groq chat completions endpoint, for testing the LLM client layer.
+
+Serves POST .../chat/completions (both /v1/chat/completions and Groq's
+/openai/v1/chat/completions), streamed or not, with configurable latency,
+answer length and injected failures. Judge prompts get a parsable relevance
+JSON, with one entry per item for batched judge prompts. load_test.py runs it in-process with start_server.
+
+Example:
+    python stub_llm_server.py --port 8001 --latency 0.3 --error-rate 0.05
+    OPENAI_BASE_URL=http://localhost:8001/v1 GROQ_BASE_URL=http://localhost:8001 OPENAI_API_KEY=stub GROQ_API_KEY=stub streamlit run app.py
+"""
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STUB_ANSWER = (
+    "Based on the FAQ database, this is a stubbed answer generated for testing. "
+    "It stands in for a real completion so that latency, retries and failures can be exercised locally."
+)
+STUB_EVALUATION = {"Relevance": "RELEVANT", "Explanation": "Stubbed evaluation."}
+
+
+def count_tokens(text):
+    # Rough whitespace count; enough for usage accounting in tests
+    return len(text.split())
+
+def stub_answer(tokens=None):
+    """STUB_ANSWER, or its words repeated or cut to `tokens` words."""
+    if not tokens:
+        return STUB_ANSWER
+    words = STUB_ANSWER.split()
+    return " ".join(words[i % len(words)] for i in range(tokens))
+
+def stub_evaluation(prompt):
+    """The judge reply for a single (judge.py's relevance prompt) or batched (BATCH_JUDGE_PROMPT) prompt."""
+    if '"evaluations"' not in prompt:
+        return json.dumps(STUB_EVALUATION)
+    ids = [int(i) for i in re.findall(r"^Item (\d+):", prompt, flags=re.MULTILINE)]
+    return json.dumps({"evaluations": [{"id": i, **STUB_EVALUATION} for i in ids]})
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        config = self.config
+        roll = random.random()
+        if roll < config.error_rate:
+            self.send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+            return
+        if roll < config.error_rate + config.rate_limit_rate:
+            self.send_json(429, {"error": {"message": "Injected rate limit", "type": "rate_limit_error"}},
+                           headers={"Retry-After": "1"})
+            return
+
+        prompt = " ".join(str(m.get("content", "")) for m in request.get("messages", []))
+        content = stub_evaluation(prompt) if '"Relevance"' in prompt else stub_answer(config.answer_tokens)
+        usage = {
+            "prompt_tokens": count_tokens(prompt),
+            "completion_tokens": count_tokens(content),
+            "total_tokens": count_tokens(prompt) + count_tokens(content),
+        }
+        model = request.get("model", "stub")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        time.sleep(config.latency)
+
+        if not request.get("stream"):
+            self.send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_chunk(choices, **extra):
+            event = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": choices, **extra}
+            self.write_chunk(f"data: {json.dumps(event)}\n\n")
+
+        for word in content.split(" "):
+            send_chunk([{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}])
+            time.sleep(config.token_delay)
+        # Usage as OpenAI (include_usage) and Groq (x_groq) report it
+        send_chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}], x_groq={"usage": usage})
+        send_chunk([], usage=usage)
+        self.write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def create_server(config):
+    StubHandler.config = config
+    server = ThreadingHTTPServer((config.host, config.port), StubHandler)
+    server.daemon_threads = True
+    logger.info(f"Stub LLM server listening on http://{config.host}:{config.port}")
+    return server
+
+def start_server(host="127.0.0.1", port=8001, latency=0.2, token_delay=0.01, answer_tokens=None,
+                 error_rate=0.0, rate_limit_rate=0.0):
+    """Serve on a daemon thread; returns the server (call shutdown() to stop it)."""
+    config = argparse.Namespace(
+        host=host, port=port, latency=latency, token_delay=token_delay, answer_tokens=answer_tokens,
+        error_rate=error_rate, rate_limit_rate=rate_limit_rate,
+    )
+    server = create_server(config)
+    threading.Thread(target=server.serve_forever, name="stub-llm-server", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub chat completions server for local testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the response (or first token)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument("--answer-tokens", type=int, default=None, help="Words per answer (default: a fixed short answer)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    args = parser.parse_args()
+
+    server = create_server(args)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Sweep retrieval parameters over the ground-truth questions and report the Pareto-optimal settings.
+
+Every combination of the given values is run through search_elasticsearch
+with reranking off, whatever RERANKING is set to, so only the retrieval
+parameters change (combinations with num_candidates < k are skipped). Hit rate and MRR are
+traded against p95 latency. Query embeddings are computed once up front, so
+the latencies compare the search itself; settings that no other setting beats on all
+three are marked with * and written under "pareto" in the JSON output,
+together with the VECTOR_SEARCH_PARAMS / TEXT_SEARCH_PARAMS value to use.
+
+Examples:
+    python sweep_retrieval.py --backend elasticsearch --num-candidates 20 50 100 500 10000 --k 5 10 20
+    python sweep_retrieval.py --backend memory --search-type Text --size 3 5 10
+"""
+import os
+import argparse
+import itertools
+import logging
+
+from benchmark_retrieval import git_revision, run_search_type
+from benchmark_utils import GROUND_TRUTH_PATH, configure_before_import, load_ground_truth, pareto_front, write_json
+from search_backend import HYBRID_SEARCH_PARAMS, TEXT_SEARCH_PARAMS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Parameters swept per search type, and the environment variable a chosen setting goes into
+PARAMS = {'Vector': HYBRID_SEARCH_PARAMS, 'Text': TEXT_SEARCH_PARAMS}
+ENV_VARS = {'Vector': "VECTOR_SEARCH_PARAMS", 'Text': "TEXT_SEARCH_PARAMS"}
+
+
+def parameter_grid(search_type, args):
+    """All combinations of the swept values; parameters not given keep their current setting."""
+    from assistant import SEARCH_PARAMS
+
+    names = list(PARAMS[search_type])
+    values = [getattr(args, name) or [SEARCH_PARAMS[search_type][name]] for name in names]
+    grid = []
+    for combination in itertools.product(*values):
+        params = dict(zip(names, combination))
+        if params.get('num_candidates', params.get('k', 0)) < params.get('k', 0):
+            continue
+        grid.append(params)
+    return grid
+
+def env_value(params):
+    return ",".join(f"{name}={value}" for name, value in params.items())
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs. latency sweep of retrieval parameters.")
+    parser.add_argument("--backend", choices=["elasticsearch", "memory"], default=os.getenv("SEARCH_BACKEND", "elasticsearch"))
+    parser.add_argument("--search-type", choices=["Text", "Vector"], default="Vector")
+    for name in {**HYBRID_SEARCH_PARAMS, **TEXT_SEARCH_PARAMS}:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=int, nargs="+", help="Values to sweep")
+    parser.add_argument("--concurrency", type=int, default=1, help="Client concurrency while measuring")
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH, help="Ground-truth questions CSV")
+    parser.add_argument("--queries", type=int, default=None, help="Limit the number of ground-truth questions")
+    parser.add_argument("--warmup", type=int, default=10, help="Queries run before measuring each setting")
+    parser.add_argument("--output", default="retrieval_sweep.json", help="Where to write JSON results")
+    args = parser.parse_args()
+
+    ground_truth = load_ground_truth(args.ground_truth, limit=args.queries)
+    # Keep every question's embedding cached
+    configure_before_import(SEARCH_BACKEND=args.backend, QUERY_EMBEDDING_CACHE_SIZE=max(len(ground_truth), 1024))
+    from assistant import encode_query, search_elasticsearch
+
+    if args.search_type == 'Vector':
+        for record in ground_truth:
+            encode_query(record['question'])
+    grid = parameter_grid(args.search_type, args)
+    results = []
+    for i, params in enumerate(grid, start=1):
+        logger.info(f"Setting {i}/{len(grid)}: {env_value(params)}")
+        result = run_search_type(
+            lambda query, search_type: search_elasticsearch(query, search_type, params, rerank=False),
+            ground_truth, args.search_type, args.concurrency, args.warmup,
+        )
+        results.append({
+            'params': params,
+            'hit_rate': result['hit_rate'],
+            'mrr': result['mrr'],
+            'p95_ms': result['latency']['p95_ms'],
+            'latency': result['latency'],
+            'qps': result['qps'],
+            'errors': result['errors'],
+        })
+
+    front = pareto_front([r for r in results if not r['errors']], maximize=('hit_rate', 'mrr'), minimize=('p95_ms',))
+    front.sort(key=lambda r: r['p95_ms'])
+    print(f"  {'hit rate':>9} {'MRR':>7} {'p95 ms':>8} {'errors':>6}  params")
+    for r in sorted(results, key=lambda r: r['p95_ms']):
+        marker = "*" if r in front else " "
+        print(f"{marker} {r['hit_rate']:>9.3f} {r['mrr']:>7.3f} {r['p95_ms']:>8.2f} {r['errors']:>6}  {env_value(r['params'])}")
+    env_var = ENV_VARS[args.search_type]
+    for r in front:
+        r['env'] = f"{env_var}={env_value(r['params'])}"
+    write_json(args.output, {
+        'revision': git_revision(), 'backend': args.backend, 'search_type': args.search_type,
+        'queries': len(ground_truth), 'results': results, 'pareto': front,
+    })
+
+
+if __name__ == "__main__":
+    main()
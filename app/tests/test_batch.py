@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+# Imports the assistant and its search and LLM client dependencies
+batch = pytest.importorskip("batch")
+
+
+def test_load_checkpoint_keeps_the_latest_result_per_question(tmp_path):
+    path = tmp_path / "run.jsonl"
+    lines = [
+        json.dumps({'index': 0, 'error': "timeout"}),
+        json.dumps({'index': 1, 'answer_llm': "first"}),
+        json.dumps({'index': 0, 'answer_llm': "retried"}),
+        '{"index": 2, "answer',  # Cut short by an interrupted run
+    ]
+    path.write_text("\n".join(lines) + "\n")
+    results = batch.load_checkpoint(str(path))
+    assert results == {0: {'index': 0, 'answer_llm': "retried"}, 1: {'index': 1, 'answer_llm': "first"}}
+
+def test_load_checkpoint_without_a_file():
+    assert batch.load_checkpoint(None) == {}
+
+def test_rate_limiter_spaces_requests(monkeypatch):
+    waits = []
+    monkeypatch.setattr(batch.time, "monotonic", lambda: 100.0)
+    monkeypatch.setattr(batch.time, "sleep", waits.append)
+    limiter = batch.RateLimiter(per_minute=120)
+    for _ in range(3):
+        limiter.acquire()
+    assert waits == [pytest.approx(0.5), pytest.approx(1.0)]
+
+def test_rate_limiter_disabled(monkeypatch):
+    monkeypatch.setattr(batch.time, "sleep", lambda wait: pytest.fail("should not wait"))
+    limiter = batch.RateLimiter(per_minute=0)
+    limiter.acquire()
+    limiter.acquire()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+from benchmark_utils import configure_before_import, hit_rate, mrr, pareto_front, parse_mapping, percentile
+
+
+def test_percentile_interpolates():
+    assert percentile([4, 1, 3, 2], 50) == pytest.approx(2.5)
+    assert percentile([1, 2, 3, 4, 5], 95) == pytest.approx(4.8)
+    assert percentile([], 95) == 0.0
+
+def test_hit_rate_and_mrr():
+    relevance = [[False, True], [True, False], [False, False]]
+    assert hit_rate(relevance) == pytest.approx(2 / 3)
+    assert mrr(relevance) == pytest.approx((1 / 2 + 1) / 3)
+
+def test_pareto_front_drops_dominated_rows():
+    rows = [
+        {'name': 'fast', 'hit_rate': 0.8, 'p95_ms': 10},
+        {'name': 'accurate', 'hit_rate': 0.9, 'p95_ms': 30},
+        {'name': 'dominated', 'hit_rate': 0.8, 'p95_ms': 20},
+        {'name': 'duplicate', 'hit_rate': 0.8, 'p95_ms': 10},
+    ]
+    front = pareto_front(rows, maximize=('hit_rate',), minimize=('p95_ms',))
+    assert [row['name'] for row in front] == ['fast', 'accurate', 'duplicate']
+
+def test_parse_mapping():
+    assert parse_mapping("openai=8, groq=4,bad") == {'openai': 8, 'groq': 4}
+
+def test_configure_before_import_warns_once_modules_are_loaded(monkeypatch, caplog):
+    monkeypatch.setenv("BENCHMARK_TEST_SETTING", "0")
+    monkeypatch.setitem(sys.modules, "reranker", object())
+    configure_before_import(BENCHMARK_TEST_SETTING=5)
+    assert os.environ["BENCHMARK_TEST_SETTING"] == "5"
+    assert "reranker" in caplog.text
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from cache import EmbeddingCache, LRUCache, ScoreCache
+
+
+def test_lru_cache_evicts_the_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+def test_disabled_cache_stores_nothing():
+    cache = LRUCache(maxsize=0)
+    cache.put("a", 1)
+    assert cache.get("a", "missing") == "missing"
+    assert cache.stats()['size'] == 0
+
+def test_embedding_cache_normalizes_the_query():
+    cache = EmbeddingCache(maxsize=10)
+    calls = []
+    encode = lambda text: calls.append(text) or [len(calls)]
+    assert cache.get_or_compute("What is  RAG?", "model", encode) == [1]
+    assert cache.get_or_compute("what is rag?", "model", encode) == [1]
+    assert cache.get_or_compute("what is rag?", "other-model", encode) == [2]
+    assert calls == ["What is  RAG?", "what is rag?"]
+
+def test_score_cache_returns_only_scored_documents():
+    cache = ScoreCache(maxsize=10)
+    cache.put_many("model", "Query", {"a": 0.0, "b": 1.5})
+    assert cache.get_many("model", " query ", ["a", "b", "c"]) == {"a": 0.0, "b": 1.5}
+    assert cache.stats()['misses'] == 1
@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+import db
+from db import DbWriter
+
+
+@pytest.fixture
+def written(monkeypatch):
+    """Records what the writer sends to the database; rows whose id is "bad" fail."""
+    calls = []
+
+    def write_rows(conversations=(), relevance_updates=(), feedback=()):
+        batch = ([("conversation", row) for row in conversations] + [("relevance", row) for row in relevance_updates]
+                 + [("feedback", row) for row in feedback])
+        if any(db.row_conversation_id(kind, row) == "bad" for kind, row in batch):
+            raise RuntimeError("bad row")
+        calls.append([row for _, row in batch])
+
+    monkeypatch.setattr(db, "write_rows", write_rows)
+    return calls
+
+def conversation(conversation_id):
+    return ((conversation_id, "question"), [])
+
+def test_rows_are_batched_in_submission_order(written):
+    writer = DbWriter(batch_size=10, flush_interval=0.05)
+    writer.submit("conversation", conversation("a"))
+    writer.submit("relevance", ("a", "RELEVANT"))
+    writer.submit("conversation", conversation("b"))
+    writer.flush()
+    writer.stop()
+    assert written == [[conversation("a"), conversation("b"), ("a", "RELEVANT")]]
+    stats = writer.stats()
+    assert (stats['written'], stats['batches'], stats['failed']) == (3, 1, 0)
+
+def test_a_failing_row_only_drops_itself(written):
+    writer = DbWriter(batch_size=10, flush_interval=0.05, max_retries=1)
+    for conversation_id in ("a", "bad", "b"):
+        writer.submit("conversation", conversation(conversation_id))
+    writer.submit("feedback", ("a", 1))
+    writer.flush()
+    writer.stop()
+    assert written == [[conversation("a")], [conversation("b")], [("a", 1)]]
+    assert writer.stats()['failed'] == 1
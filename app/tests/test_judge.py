@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+# Imports the assistant and its search and LLM client dependencies
+judge = pytest.importorskip("judge")
+
+
+def item(item_id, relevance="RELEVANT", explanation="Answers the question."):
+    return {'id': item_id, 'Relevance': relevance, 'Explanation': explanation}
+
+def test_parses_the_evaluations_object():
+    reply = json.dumps({'evaluations': [item(1), item(2, "NON_RELEVANT", "Off topic.")]})
+    assert judge.parse_batch_evaluation(reply, {1, 2}) == {
+        1: ("RELEVANT", "Answers the question."),
+        2: ("NON_RELEVANT", "Off topic."),
+    }
+
+def test_tolerates_code_fences_and_a_bare_list():
+    reply = "```json\n" + json.dumps([item(1), item("2", "PARTLY_RELEVANT")]) + "\n```"
+    assert set(judge.parse_batch_evaluation(reply, {1, 2})) == {1, 2}
+
+def test_recovers_items_from_a_truncated_reply():
+    reply = '{"evaluations": [' + json.dumps(item(1)) + ', {"id": 2, "Relevance": "REL'
+    assert judge.parse_batch_evaluation(reply, {1, 2}) == {1: ("RELEVANT", "Answers the question.")}
+
+def test_leaves_out_malformed_and_unknown_items():
+    reply = json.dumps([item(1, "MAYBE"), item("x"), item(7), {'id': 3, 'Relevance': "RELEVANT"}, "text"])
+    assert judge.parse_batch_evaluation(reply, {1, 3}) == {3: ("RELEVANT", "No explanation provided.")}
+
+def test_unparseable_reply():
+    assert judge.parse_batch_evaluation("I cannot judge these.", {1}) == {}
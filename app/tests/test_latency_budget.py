@@ -0,0 +1,58 @@
+import pytest
+
+import latency_budget
+from latency_budget import MIN_SAMPLES, LatencyBudget, StageEstimates, answer_key
+
+# Default estimates: vector search 0.5s, keyword search 0.2s, answer 4.0s (3.2s trimmed), judge 2.0s
+ORDER = ["keyword_search", "trim_context", "fast_model", "skip_judge"]
+
+
+@pytest.fixture(autouse=True)
+def estimates(monkeypatch):
+    estimates = StageEstimates()
+    monkeypatch.setattr(latency_budget, "stage_estimates", estimates)
+    monkeypatch.setattr(latency_budget.time, "time", lambda: 100.0)
+    return estimates
+
+def budget(seconds, search_type="Vector", judge_inline=True, model_choice="gpt-4o", fast_model="gpt-4o-mini"):
+    return LatencyBudget(seconds, model_choice, search_type, judge_inline, start_time=100.0, order=ORDER,
+                         fast_model=fast_model)
+
+def test_disabled_budget_plans_nothing():
+    plan = budget(0)
+    assert not plan.enabled
+    assert plan.plan("search") == []
+
+def test_no_degradation_when_the_projection_fits():
+    plan = budget(10)
+    assert plan.plan("search") == []
+    assert plan.plan("prompt") == []
+    assert plan.search_type_used == "Vector" and plan.model_used == "gpt-4o"
+
+def test_degradations_apply_in_order_at_their_stage():
+    plan = budget(5.5)
+    # 6.5s projected: keyword search (6.2s) is not enough, trimming the context (5.4s) is
+    assert plan.plan("search") == ["keyword_search"]
+    assert plan.search_type_used == "Text"
+    assert not plan.trimmed
+    assert plan.plan("prompt") == ["trim_context"]
+    assert plan.trimmed and plan.model_used == "gpt-4o"
+    assert plan.plan("judge") == []
+
+def test_unavailable_degradations_are_passed_over():
+    plan = budget(3.0, search_type="Text", judge_inline=False, fast_model="gpt-4o")
+    assert plan.plan("search") == []
+    assert plan.plan("prompt") == ["trim_context"]
+    assert plan.applied == ["trim_context"]
+
+def test_degradations_of_stages_already_run_are_not_taken():
+    plan = budget(1.0)
+    assert plan.plan("prompt") == ["trim_context", "fast_model"]
+    assert not plan.degraded("keyword_search")
+
+def test_observed_durations_replace_the_defaults(estimates):
+    assert estimates.answer("gpt-4o", trimmed=False) == 4.0
+    for _ in range(MIN_SAMPLES):
+        estimates.record(answer_key("gpt-4o", False), 1.0)
+    assert estimates.answer("gpt-4o", trimmed=False) == pytest.approx(1.0)
+    assert estimates.answer("gpt-4o", trimmed=True) == pytest.approx(0.8)
@@ -0,0 +1,57 @@
+import pytest
+
+for module in ("httpx", "openai", "groq", "dotenv"):
+    pytest.importorskip(module)
+
+import llm_clients
+from llm_clients import CircuitBreaker, is_provider_error
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_clients.time, "monotonic", lambda: now[0])
+    return now
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock[0] += 29
+    assert not breaker.allow()
+
+def test_released_probe_lets_the_next_request_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+
+def test_only_provider_errors_count():
+    assert not is_provider_error(ValueError("bug in the caller"))
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import reranker
+
+DOCUMENTS = [{'doc_id': doc_id, 'Question': doc_id, 'Answer': ""} for doc_id in ("a", "b", "c")]
+
+
+class Model:
+    def __init__(self, scores, delay=0.0):
+        self.scores = scores
+        self.delay = delay
+        self.calls = 0
+
+    def predict(self, pairs, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return [self.scores[document.split("\n")[0]] for _, document in pairs]
+
+
+class Loaded:
+    def __init__(self, model):
+        self.model = model
+
+    def get(self):
+        return self.model
+
+
+@pytest.fixture
+def use_model(monkeypatch):
+    monkeypatch.setattr(reranker, "score_cache", reranker.ScoreCache(maxsize=100))
+
+    def use(model):
+        monkeypatch.setattr(reranker, "_cross_encoder", Loaded(model))
+        return model
+    return use
+
+def test_reorders_by_score_and_reuses_cached_scores(use_model):
+    model = use_model(Model({"a": 0.1, "b": 0.9, "c": 0.5}))
+    assert [doc['doc_id'] for doc in reranker.rerank("q", DOCUMENTS, top_n=2)] == ["b", "c"]
+    assert [doc['doc_id'] for doc in reranker.rerank("q", DOCUMENTS, top_n=2)] == ["b", "c"]
+    assert model.calls == 1
+
+def test_keeps_the_retrieval_order_when_over_budget(use_model):
+    use_model(Model({"a": 0.1, "b": 0.9, "c": 0.5}, delay=0.2))
+    assert reranker.rerank("slow", DOCUMENTS, top_n=2, budget_ms=10) is DOCUMENTS
+    # The abandoned pass still finishes and fills the cache
+    with reranker._slots:
+        pass
+    assert reranker.score_cache.get_many(reranker.RERANK_MODEL, "slow", ["b"]) == {"b": 0.9}
+
+def test_keeps_the_retrieval_order_when_scoring_fails(use_model):
+    use_model(Model({}))
+    assert reranker.rerank("q", DOCUMENTS) is DOCUMENTS
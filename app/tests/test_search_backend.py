@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from search_backend import BM25Index, compute_rrf, rrf_fuse
+
+
+def test_rrf_fuse_ranks_documents_found_by_both_legs_first():
+    knn = [("a", {"id": "a"}), ("b", {"id": "b"}), ("c", {"id": "c"})]
+    keyword = [("c", None), ("a", None), ("d", {"id": "d"})]
+    fused = rrf_fuse([knn, keyword], k=60, top_n=3)
+    assert [doc_id for doc_id, _ in fused] == ["a", "c", "b"]
+
+def test_rrf_fuse_keeps_the_first_source_found():
+    fused = rrf_fuse([[("a", None)], [("a", {"id": "a"})]], top_n=1)
+    assert fused == [("a", {"id": "a"})]
+
+def test_compute_rrf():
+    assert compute_rrf(1, k=60) == pytest.approx(1 / 61)
+
+
+DOCUMENTS = [
+    {"Question": "How do transformers use attention?", "Answer": "Self-attention over tokens."},
+    {"Question": "What is gradient descent?", "Answer": "An optimizer following the negative gradient."},
+    {"Question": "Attention attention attention", "Answer": "Repeated."},
+]
+
+def test_bm25_ranks_matching_documents_only():
+    index = BM25Index(DOCUMENTS, ["Question", "Answer"])
+    ranked = index.search("gradient", {"Question": 1.0, "Answer": 1.0})
+    assert [i for i, _ in ranked] == [1]
+
+def test_bm25_term_frequency_saturates_and_boosts_apply():
+    index = BM25Index(DOCUMENTS, ["Question", "Answer"])
+    ranked = dict(index.search("attention", {"Question": 1.0}))
+    assert ranked[2] > ranked[0]
+    # Three occurrences score less than three times one occurrence
+    assert ranked[2] < 3 * ranked[0]
+    boosted = dict(index.search("attention", {"Question": 3.0}))
+    assert boosted[0] == pytest.approx(3 * ranked[0])
+
+def test_bm25_unknown_terms_score_nothing():
+    index = BM25Index(DOCUMENTS, ["Question"])
+    assert index.search("unrelated", {"Question": 1.0}) == []
@@ -0,0 +1,44 @@
+import time
+import contextvars
+from contextlib import contextmanager
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Per-request collection of stage durations."""
+
+    def __init__(self):
+        self.spans = []
+
+    def record(self, name, duration):
+        self.spans.append((name, duration))
+
+    def timings(self):
+        """Stage name -> total duration in milliseconds (repeated stages are summed)."""
+        totals = {}
+        for name, duration in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration * 1000
+        return totals
+
+
+@contextmanager
+def start_trace():
+    """Make a new Trace current for the enclosed block."""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as stage `name`; a no-op outside of a trace."""
+    trace = _current_trace.get()
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.record(name, time.perf_counter() - start_time)